@@ -0,0 +1,77 @@
+"""company service stats
+
+Revision ID: 3c7e9b2f5a18
+Revises: 9e3d6a41c8b2
+Create Date: 2026-10-17 15:12:04.518230
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c7e9b2f5a18'
+down_revision = '9e3d6a41c8b2'
+branch_labels = None
+depends_on = None
+
+COUNTERS = [
+    ('new_count', "s.status = 'NEW'"),
+    ('working_count', "s.status = 'WORKING'"),
+    ('verifying_count', "s.status = 'VERIFYING'"),
+    ('closed_count', "s.status = 'CLOSED'"),
+    ('unviewed_admin', "NOT s.viewed_admin"),
+    ('new_unviewed_admin', "s.status = 'NEW' AND NOT s.viewed_admin"),
+    ('working_unviewed_admin', "s.status = 'WORKING' AND NOT s.viewed_admin"),
+    ('verifying_unviewed_admin', "s.status = 'VERIFYING' AND NOT s.viewed_admin"),
+    ('closed_unviewed_admin', "s.status = 'CLOSED' AND NOT s.viewed_admin"),
+    ('unviewed_executor', "NOT s.viewed_executor"),
+    ('working_unviewed_executor', "s.status = 'WORKING' AND NOT s.viewed_executor"),
+    ('verifying_unviewed_executor', "s.status = 'VERIFYING' AND NOT s.viewed_executor"),
+    ('closed_unviewed_executor', "s.status = 'CLOSED' AND NOT s.viewed_executor"),
+]
+
+
+def _stats_select(executor_column: str, where: str, group_by: str) -> str:
+    counters = ", ".join(f"count(*) FILTER (WHERE {condition})" for _, condition in COUNTERS)
+    return (
+        f"SELECT s.company_id, {executor_column}, {counters}, max(s.updated_at) "
+        f"FROM public.services s WHERE {where} GROUP BY {group_by}"
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        'company_service_stats',
+        sa.Column('company_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('executor_id', sa.Integer(), server_default='0', nullable=False),
+        *(sa.Column(name, sa.Integer(), server_default='0', nullable=False) for name, _ in COUNTERS),
+        sa.Column('last_activity_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['company_id'], ['public.company.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('company_id', 'executor_id'),
+        schema='public'
+    )
+    op.create_index(
+        'ix_public_company_service_stats_executor_id_last_activity_at',
+        'company_service_stats',
+        ['executor_id', 'last_activity_at', 'company_id'],
+        unique=False,
+        schema='public'
+    )
+
+    # Начальное заполнение счётчиков по существующим заявкам
+    columns = ", ".join(['company_id', 'executor_id', *(name for name, _ in COUNTERS), 'last_activity_at'])
+    op.execute(
+        f"INSERT INTO public.company_service_stats ({columns}) "
+        + _stats_select("0", "s.company_id IS NOT NULL", "s.company_id")
+        + " UNION ALL "
+        + _stats_select("s.executor_id", "s.company_id IS NOT NULL AND s.executor_id IS NOT NULL",
+                        "s.company_id, s.executor_id")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_public_company_service_stats_executor_id_last_activity_at',
+                  table_name='company_service_stats', schema='public')
+    op.drop_table('company_service_stats', schema='public')
@@ -0,0 +1,34 @@
+"""company stats last activity not null
+
+Revision ID: d8c2f5e1a407
+Revises: b4e1d7a2c935
+Create Date: 2026-10-17 23:52:37.109846
+
+Список компаний листается курсором (last_activity_at, company_id): строка с NULL обрывала страницы.
+Таблица счётчиков небольшая (строка на компанию и исполнителя), заполняется одним UPDATE.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd8c2f5e1a407'
+down_revision = 'b4e1d7a2c935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE public.company_service_stats st SET last_activity_at = coalesce(("
+        "SELECT max(s.updated_at) FROM public.services s WHERE s.company_id = st.company_id "
+        "AND (st.executor_id = 0 OR s.executor_id = st.executor_id)), now()) "
+        "WHERE last_activity_at IS NULL"
+    )
+    op.alter_column('company_service_stats', 'last_activity_at', existing_type=sa.DateTime(),
+                    server_default=sa.text('now()'), nullable=False, schema='public')
+
+
+def downgrade() -> None:
+    op.alter_column('company_service_stats', 'last_activity_at', existing_type=sa.DateTime(),
+                    server_default=None, nullable=True, schema='public')
@@ -0,0 +1,31 @@
+"""company stats services count
+
+Revision ID: f3a9c6d2b871
+Revises: e7b3f19c4a62
+Create Date: 2026-10-17 23:05:41.207318
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c6d2b871'
+down_revision = 'e7b3f19c4a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('company_service_stats',
+                  sa.Column('services_count', sa.Integer(), server_default='0', nullable=False),
+                  schema='public')
+    op.execute(
+        "UPDATE public.company_service_stats st SET services_count = ("
+        "SELECT count(*) FROM public.services s WHERE s.company_id = st.company_id "
+        "AND (st.executor_id = 0 OR s.executor_id = st.executor_id))"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('company_service_stats', 'services_count', schema='public')
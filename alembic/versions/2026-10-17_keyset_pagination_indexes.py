@@ -0,0 +1,53 @@
+"""keyset pagination indexes
+
+Revision ID: 5b1f0c2a7d41
+Revises:
+Create Date: 2026-10-17 10:12:03.418220
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c2a7d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_public_services_company_id_status_updated_at',
+            'services',
+            ['company_id', 'status', 'updated_at', 'id'],
+            schema='public',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_public_users_created_at_id',
+            'users',
+            ['created_at', 'id'],
+            schema='public',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_public_users_created_at_id',
+            table_name='users',
+            schema='public',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            'ix_public_services_company_id_status_updated_at',
+            table_name='services',
+            schema='public',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,30 @@
+"""media file renditions
+
+Revision ID: c58e2b7a9d14
+Revises: a41d7c3e9f06
+Create Date: 2026-10-17 20:31:12.093551
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c58e2b7a9d14'
+down_revision = 'a41d7c3e9f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'media_files',
+        sa.Column('renditions', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'[]'::jsonb"),
+                  nullable=False),
+        schema='public'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('media_files', 'renditions', schema='public')
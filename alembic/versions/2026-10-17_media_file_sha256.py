@@ -0,0 +1,24 @@
+"""media file sha256
+
+Revision ID: e7b3f19c4a62
+Revises: c58e2b7a9d14
+Create Date: 2026-10-17 21:48:37.415902
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f19c4a62'
+down_revision = 'c58e2b7a9d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('media_files', sa.Column('sha256', sa.String(length=64), nullable=True), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('media_files', 'sha256', schema='public')
@@ -0,0 +1,101 @@
+"""service filter indexes
+
+Revision ID: 9e3d6a41c8b2
+Revises: 5b1f0c2a7d41
+Create Date: 2026-10-17 11:40:27.902314
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9e3d6a41c8b2'
+down_revision = '5b1f0c2a7d41'
+branch_labels = None
+depends_on = None
+
+# Индексы по первичным ключам, которые дублируют индекс самого PRIMARY KEY
+REDUNDANT_PK_INDEXES = [
+    ('ix_public_services_id', 'services', False),
+    ('ix_public_users_id', 'users', True),
+    ('ix_public_media_files_id', 'media_files', False),
+    ('ix_public_company_id', 'company', False),
+    ('ix_public_company_contacts_id', 'company_contacts', False),
+]
+
+
+def upgrade() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_public_services_executor_id_company_id_status_updated_at',
+            'services',
+            ['executor_id', 'company_id', 'status', 'updated_at', 'id'],
+            schema='public',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_public_services_customer_id_company_id_status_updated_at',
+            'services',
+            ['customer_id', 'company_id', 'status', 'updated_at', 'id'],
+            schema='public',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_public_services_company_id_status_unviewed_admin',
+            'services',
+            ['company_id', 'status'],
+            schema='public',
+            postgresql_where=sa.text('viewed_admin = false'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_public_services_executor_id_company_id_status_unviewed_executor',
+            'services',
+            ['executor_id', 'company_id', 'status'],
+            schema='public',
+            postgresql_where=sa.text('viewed_executor = false'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+        for index_name, table_name, _ in REDUNDANT_PK_INDEXES:
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                schema='public',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name, unique in REDUNDANT_PK_INDEXES:
+            op.create_index(
+                index_name,
+                table_name,
+                ['id'],
+                unique=unique,
+                schema='public',
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+        for index_name in [
+            'ix_public_services_executor_id_company_id_status_unviewed_executor',
+            'ix_public_services_company_id_status_unviewed_admin',
+            'ix_public_services_customer_id_company_id_status_updated_at',
+            'ix_public_services_executor_id_company_id_status_updated_at',
+        ]:
+            op.drop_index(
+                index_name,
+                table_name='services',
+                schema='public',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
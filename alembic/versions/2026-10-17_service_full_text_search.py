@@ -0,0 +1,82 @@
+"""service full text search
+
+Revision ID: a41d7c3e9f06
+Revises: 6f2a8d4c1e93
+Create Date: 2026-10-17 18:05:37.661945
+
+search_vector - обычная колонка, которую заполняет триггер, а не GENERATED ... STORED: добавление
+вычисляемой колонки переписывает всю таблицу services под ACCESS EXCLUSIVE. Колонка без значения
+по умолчанию добавляется мгновенно, существующие заявки заполняются пачками по id в отдельных
+транзакциях, индекс строится CONCURRENTLY.
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a41d7c3e9f06'
+down_revision = '6f2a8d4c1e93'
+branch_labels = None
+depends_on = None
+
+# {row} - "NEW." в триггере, пусто в UPDATE заполнения
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce({row}description, '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce({row}comment, '')), 'C')"
+)
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.add_column('services', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True), schema='public')
+    # Новые и изменённые заявки получают вектор сразу, до заполнения существующих
+    op.execute(f"""
+        CREATE FUNCTION public.services_search_vector() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("CREATE TRIGGER services_search_vector BEFORE INSERT OR UPDATE OF title, description, comment "
+               "ON public.services FOR EACH ROW EXECUTE FUNCTION public.services_search_vector()")
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции; пачки - каждая в своей транзакции
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        backfill = sa.text(
+            "WITH batch AS (SELECT id FROM public.services WHERE id > :last_id ORDER BY id LIMIT :batch_size) "
+            f"UPDATE public.services SET search_vector = {SEARCH_VECTOR.format(row='')} "
+            "WHERE id IN (SELECT id FROM batch) RETURNING id"
+        )
+        last_id = '00000000-0000-0000-0000-000000000000'
+        while ids := bind.execute(backfill, {"last_id": last_id, "batch_size": BATCH_SIZE}).scalars().all():
+            last_id = max(ids)
+
+        op.create_index(
+            'ix_public_services_search_vector',
+            'services',
+            ['search_vector'],
+            schema='public',
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_public_services_search_vector',
+            table_name='services',
+            schema='public',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.execute("DROP TRIGGER IF EXISTS services_search_vector ON public.services")
+    op.execute("DROP FUNCTION IF EXISTS public.services_search_vector()")
+    op.drop_column('services', 'search_vector', schema='public')
@@ -0,0 +1,44 @@
+"""services updated_at not null
+
+Revision ID: b4e1d7a2c935
+Revises: f3a9c6d2b871
+Create Date: 2026-10-17 23:40:12.554019
+
+Курсор списков заявок (updated_at, id) сравнивается как значение строки: заявка с NULL updated_at
+обрывала страницы. Пустые updated_at заполняются created_at пачками, затем колонка объявляется NOT NULL
+через проверенное ограничение CHECK - без полного просмотра таблицы под ACCESS EXCLUSIVE.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b4e1d7a2c935'
+down_revision = 'f3a9c6d2b871'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    # Каждая пачка и каждый шаг - в своей транзакции, блокировки не накапливаются
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        backfill = sa.text(
+            "UPDATE public.services SET updated_at = created_at WHERE id IN ("
+            "SELECT id FROM public.services WHERE updated_at IS NULL LIMIT :batch_size)"
+        )
+        while bind.execute(backfill, {"batch_size": BATCH_SIZE}).rowcount:
+            pass
+
+        op.execute("ALTER TABLE public.services ADD CONSTRAINT ck_services_updated_at_not_null "
+                   "CHECK (updated_at IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE public.services VALIDATE CONSTRAINT ck_services_updated_at_not_null")
+        # Проверенный CHECK позволяет SET NOT NULL не просматривать таблицу
+        op.alter_column('services', 'updated_at', nullable=False, schema='public')
+        op.drop_constraint('ck_services_updated_at_not_null', 'services', schema='public')
+
+
+def downgrade() -> None:
+    op.alter_column('services', 'updated_at', nullable=True, schema='public')
@@ -0,0 +1,84 @@
+"""trigram search
+
+Revision ID: 6f2a8d4c1e93
+Revises: 3c7e9b2f5a18
+Create Date: 2026-10-17 16:48:51.204117
+
+phone_digits - обычная колонка, которую заполняет триггер, а не GENERATED ... STORED: добавление
+вычисляемой колонки переписывает всю таблицу users под ACCESS EXCLUSIVE. Колонка без значения
+по умолчанию добавляется мгновенно, существующие строки заполняются пачками по id в отдельных
+транзакциях, индексы строятся CONCURRENTLY.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '6f2a8d4c1e93'
+down_revision = '3c7e9b2f5a18'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = [
+    ('ix_public_users_name_trgm', 'users', 'name'),
+    ('ix_public_users_phone_digits_trgm', 'users', 'phone_digits'),
+    ('ix_public_company_name_trgm', 'company', 'name'),
+    ('ix_public_company_address_trgm', 'company', 'address'),
+]
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('users', sa.Column('phone_digits', sa.String(), nullable=True), schema='public')
+    # Новые и изменённые строки получают значение сразу, до заполнения существующих
+    op.execute("""
+        CREATE FUNCTION public.users_phone_digits() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.phone_digits := regexp_replace(NEW.phone, '[^0-9]', '', 'g');
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("CREATE TRIGGER users_phone_digits BEFORE INSERT OR UPDATE OF phone ON public.users "
+               "FOR EACH ROW EXECUTE FUNCTION public.users_phone_digits()")
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции; пачки - каждая в своей транзакции
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text("SELECT max(id) FROM public.users")).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(
+                sa.text("UPDATE public.users SET phone_digits = regexp_replace(phone, '[^0-9]', '', 'g') "
+                        "WHERE id > :start AND id <= :end AND phone IS NOT NULL"),
+                {"start": start, "end": start + BATCH_SIZE},
+            )
+
+        for name, table, column in TRIGRAM_INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                schema='public',
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(TRIGRAM_INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                schema='public',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+
+    op.execute("DROP TRIGGER IF EXISTS users_phone_digits ON public.users")
+    op.execute("DROP FUNCTION IF EXISTS public.users_phone_digits()")
+    op.drop_column('users', 'phone_digits', schema='public')
@@ -2,6 +2,7 @@
 
 import multiprocessing
 import os
+import shutil
 
 host = os.getenv("HOST", "0.0.0.0")
 port = os.getenv("PORT", "8000")
@@ -40,3 +41,12 @@ graceful_timeout = int(graceful_timeout_str)
 timeout = int(timeout_str)
 keepalive = int(keepalive_str)
 logconfig = os.getenv("LOG_CONFIG", "/src/logging_production.ini")
+
+metrics_dir = os.getenv("METRICS_DIR")
+
+
+def on_starting(server):
+    # Снимки метрик воркеров прошлого запуска не должны попасть в сумму
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
@@ -10,6 +10,7 @@ export APP_MODULE=${APP_MODULE:-"$MODULE_NAME:$VARIABLE_NAME"}
 
 DEFAULT_GUNICORN_CONF=/src/gunicorn/gunicorn_conf.py
 export GUNICORN_CONF=${GUNICORN_CONF:-$DEFAULT_GUNICORN_CONF}
+export METRICS_DIR=${METRICS_DIR:-/dev/shm/metrics}
 export WORKER_CLASS=${WORKER_CLASS:-"uvicorn.workers.UvicornWorker"}
 
 # Start Gunicorn
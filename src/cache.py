@@ -0,0 +1,155 @@
+"""
+Кэш ответов списков в памяти воркера (TTL + LRU).
+
+Запись кэша привязана к версиям областей данных (например, заявки одной компании или список компаний).
+Изменяющие функции после commit увеличивают версию своих областей, и записи с устаревшей версией
+больше не отдаются. Версии запоминаются до выполнения запроса к базе, поэтому ответ, посчитанный
+параллельно с изменением, не переживает инвалидацию.
+"""
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.metrics import cache_requests
+
+COMPANIES_SCOPE = "companies"  # список компаний со счётчиками
+
+
+def company_scope(company_id: Any) -> tuple[str, str]:
+    """Заявки одной компании"""
+    return "company", str(company_id)
+
+
+def service_scope(service_id: Any) -> tuple[str, str]:
+    """Данные одной заявки (карточка, медиафайлы)"""
+    return "service", str(service_id)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, tuple[int, ...], tuple[Hashable, ...], Any]] = OrderedDict()
+        self._versions: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bypass = False  # кэш временно не используется (нет связи с шиной инвалидации, см. cache_bus)
+        self.listeners: list[Callable[[tuple[Hashable, ...] | None], None]] = []  # None - сброс всего кэша
+
+    def versions(self, scopes: tuple[Hashable, ...]) -> tuple[int, ...]:
+        return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, versions, scopes, value = entry
+            if expires_at > time.monotonic() and versions == self.versions(scopes):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_requests.inc(result="hit")
+                return True, value
+            del self._entries[key]
+
+        self.misses += 1
+        cache_requests.inc(result="miss")
+        return False, None
+
+    def set(self, key: Hashable, value: Any, scopes: tuple[Hashable, ...], versions: tuple[int, ...]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, versions, scopes, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *scopes: Hashable) -> None:
+        for scope in scopes:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+        self.invalidations += 1
+        self._notify(scopes)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._notify(None)
+
+    def _notify(self, scopes: tuple[Hashable, ...] | None) -> None:
+        """Другие кэши воркера, зависящие от тех же областей (например, пути медиафайлов)"""
+        for listener in self.listeners:
+            listener(scopes)
+
+    def stats(self) -> dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "bypass": self.bypass,
+        }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL)
+
+
+def cached(scopes: Callable[..., tuple[Hashable, ...]]):
+    """
+    Кэширует результат асинхронной функции чтения по всем её аргументам, кроме session.
+    scopes получает аргументы функции по имени и возвращает области данных, от которых зависит результат.
+    При попадании функция не вызывается, и сессия не открывает соединение с базой.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED or response_cache.bypass:
+                return await func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name != "session"}
+            key = (func.__qualname__, tuple(sorted(arguments.items())))
+
+            hit, value = response_cache.get(key)
+            if hit:
+                return value
+
+            data_scopes = scopes(**arguments)
+            versions = response_cache.versions(data_scopes)
+            value = await func(*args, **kwargs)
+            response_cache.set(key, value, data_scopes, versions)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_after_commit(session: AsyncSession, *scopes: Hashable) -> None:
+    """Инвалидировать области кэша, когда транзакция сессии будет зафиксирована"""
+    session.info.setdefault("cache_invalidate", set()).update(scopes)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    scopes = session.info.pop("cache_invalidate", None)
+    if scopes:
+        response_cache.invalidate(*scopes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("cache_invalidate", None)
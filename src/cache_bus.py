@@ -0,0 +1,108 @@
+"""
+Инвалидация кэша между воркерами через LISTEN/NOTIFY PostgreSQL.
+
+Транзакция, изменившая данные, перед commit отправляет NOTIFY с областями кэша (см. invalidate_after_commit):
+PostgreSQL доставляет уведомление только после фиксации транзакции. Каждый воркер держит одно отдельное
+соединение с LISTEN и сбрасывает у себя записи этих областей.
+
+Пока соединения нет, уведомления теряются, поэтому кэш воркера не используется, а после (пере)подключения
+очищается целиком.
+"""
+import asyncio
+import json
+import logging
+import random
+from typing import Any, Hashable
+
+import asyncpg
+from sqlalchemy import event, func, make_url, select
+from sqlalchemy.orm import Session
+
+from src.cache import response_cache
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_CHANNEL = "cache_invalidate"
+
+
+def _encode_scopes(scopes: set[Hashable]) -> str:
+    return json.dumps({"scopes": [list(scope) if isinstance(scope, tuple) else scope for scope in scopes]})
+
+
+def _decode_scopes(payload: str) -> list[Hashable]:
+    scopes = json.loads(payload)["scopes"]
+    return [tuple(scope) if isinstance(scope, list) else scope for scope in scopes]
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_before_commit(session: Session) -> None:
+    scopes = session.info.get("cache_invalidate")
+    if not scopes or not settings.CACHE_BUS_ENABLED:
+        return
+
+    session.info["primary_only"] = True  # NOTIFY должен уйти в ту же транзакцию в primary
+    session.execute(select(func.pg_notify(CACHE_CHANNEL, _encode_scopes(scopes))))
+
+
+class CacheInvalidationBus:
+    """Фоновое LISTEN-соединение воркера; переподключается с экспоненциальной задержкой"""
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            response_cache.bypass = True
+            self._task = asyncio.create_task(self._run(), name="cache-invalidation-bus")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            response_cache.invalidate(*_decode_scopes(payload))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Invalid cache invalidation payload: %s", payload)
+            response_cache.clear()
+
+    async def _run(self) -> None:
+        attempt = 0
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CACHE_CHANNEL, self._on_notification)
+
+                # Всё, что изменилось до подключения, могло пройти мимо этого воркера
+                response_cache.clear()
+                response_cache.bypass = False
+                attempt = 0
+
+                while True:
+                    await asyncio.sleep(settings.CACHE_BUS_PING_INTERVAL)
+                    await asyncio.wait_for(connection.fetchval("SELECT 1"), settings.CACHE_BUS_PING_INTERVAL)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                response_cache.bypass = True
+                response_cache.clear()
+                delay = min(settings.CACHE_BUS_RECONNECT_MAX_DELAY, 0.5 * 2 ** attempt) * random.uniform(0.5, 1)
+                attempt += 1
+                logger.warning("Cache invalidation listener disconnected (%s), reconnecting in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+
+
+cache_bus = CacheInvalidationBus(make_url(str(settings.DATABASE_URL)).set(drivername="postgresql")
+                                 .render_as_string(hide_password=False))
@@ -4,13 +4,70 @@ from dotenv import load_dotenv
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings
 
-from src.constants import Environment
+from src.constants import Environment, MediaOffload
 
 load_dotenv()
 
 
 class Config(BaseSettings):
     DATABASE_URL: PostgresDsn
+    DATABASE_POOL_ENABLED: bool = True
+    DATABASE_MAX_CONNECTIONS: int = 90  # общий бюджет соединений на все воркеры
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 5
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_RECYCLE: int = 60 * 30  # seconds
+    DATABASE_POOL_TIMEOUT: int = 30  # seconds
+
+    DATABASE_REPLICA_URLS: list[PostgresDsn] = []
+    DATABASE_REPLICA_MAX_LAG: float = 5.0  # seconds
+    DATABASE_REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # seconds
+
+    GUNICORN_CONF: str | None = None
+
+    COMPANY_STATS_ENABLED: bool = True  # список компаний из company_service_stats вместо агрегата по заявкам
+
+    RESPONSE_CACHE_ENABLED: bool = True  # кэш списков компаний и заявок в памяти воркера
+    RESPONSE_CACHE_TTL: float = 30.0  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    MEDIA_PATH_CACHE_MAX_ENTRIES: int = 10000  # ключ медиафайла -> путь на диске, в памяти воркера
+    CACHE_BUS_ENABLED: bool = True  # инвалидация кэша во всех воркерах через LISTEN/NOTIFY
+    CACHE_BUS_PING_INTERVAL: float = 10.0  # seconds
+    CACHE_BUS_RECONNECT_MAX_DELAY: float = 30.0  # seconds
+
+    SQL_INSTRUMENTATION_ENABLED: bool = True  # SQL-статистика запросов в Server-Timing и в логе
+    SQL_DEBUG: bool = False  # поиск повторяющихся запросов (N+1)
+    SQL_N_PLUS_ONE_THRESHOLD: int = 3
+
+    METRICS_DIR: str | None = None  # общий каталог снимков метрик воркеров (в production - в /dev/shm)
+    METRICS_FLUSH_INTERVAL: float = 5.0  # seconds
+    METRICS_TOKEN: str | None = None  # /metrics только с Authorization: Bearer <token>; без токена маршрута нет
+
+    LOOP_MONITOR_ENABLED: bool = True  # метрика задержки event loop и стек блокирующего кода в логе
+    LOOP_MONITOR_INTERVAL: float = 0.5  # seconds
+    LOOP_LAG_THRESHOLD: float = 0.5  # seconds
+
+    MEDIA_URL_SECRET: str | None = None  # ключ подписи ссылок на медиафайлы, по умолчанию JWT_SECRET
+    MEDIA_URL_TTL: int = 60 * 60 * 24  # seconds, ссылка действует от одного до двух окон; max-age ответа не больше
+    MEDIA_OFFLOAD: MediaOffload | None = None  # без значения файлы отдаёт воркер (локальная разработка)
+    MEDIA_OFFLOAD_PREFIX: str = "/protected/"  # internal location nginx с root/alias на каталог static
+
+    UPLOAD_MAX_VIDEO_SIZE: int = 200 * 1024 * 1024  # bytes
+    UPLOAD_MAX_IMAGE_SIZE: int = 20 * 1024 * 1024  # bytes
+    UPLOAD_MAX_REQUEST_SIZE: int = 270 * 1024 * 1024  # bytes, видео + 3 изображения + поля формы
+    # Незавершённые загрузки - вне static (StaticFiles отдал бы их без подписи); та же файловая система,
+    # что и static: завершённая загрузка переносится к видео заявки переименованием
+    RESUMABLE_UPLOADS_DIR: str = "./uploads"
+    RESUMABLE_UPLOAD_MAX_PER_USER: int = 5  # незавершённых загрузок одного пользователя
+    RESUMABLE_UPLOAD_EXPIRY: int = 60 * 60 * 24  # seconds без новых данных, после - загрузка удаляется
+    RESUMABLE_UPLOAD_GC_INTERVAL: float = 60 * 15  # seconds
+    IMAGE_MAX_PIXELS: int = 50_000_000  # защита от decompression bomb: больше пикселей - 413 без декодирования
+
+    IMAGE_POOL_SIZE: int = 2  # процессов обработки изображений на воркер
+    IMAGE_POOL_QUEUE_LIMIT: int = 16  # изображений в очереди сверх выполняющихся
+    IMAGE_POOL_QUEUE_TIMEOUT: float = 10.0  # seconds
+
+    SEARCH_TRIGRAM_ENABLED: bool = True  # поиск заказчиков и исполнителей через pg_trgm с сортировкой по похожести
 
     SITE_DOMAIN: str = "myapp.com"
 
@@ -26,3 +26,9 @@ class Environment(str, Enum):
     @property
     def is_deployed(self) -> bool:
         return self in (self.STAGING, self.PRODUCTION)
+
+
+class MediaOffload(str, Enum):
+    """Передача медиафайла фронтовым сервером вместо воркера"""
+    X_ACCEL_REDIRECT = "X-Accel-Redirect"  # nginx, internal location
+    X_SENDFILE = "X-Sendfile"  # Apache mod_xsendfile, lighttpd
@@ -1,21 +1,176 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+import math
+import random
+import runpy
+import time
+from typing import Any, AsyncGenerator
 
-from sqlalchemy import MetaData
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import MetaData, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.dml import UpdateBase
 
 from src.config import settings
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = str(settings.DATABASE_URL)
 
 Base = declarative_base()
 metadata = MetaData()
 
-engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+
+def get_workers_count() -> int:
+    """Кол-во воркеров gunicorn, читается из gunicorn_conf.py (в dev-режиме uvicorn - один процесс)"""
+    if not settings.GUNICORN_CONF:
+        return 1
+    try:
+        gunicorn_conf = runpy.run_path(settings.GUNICORN_CONF)
+    except OSError:
+        return 1
+    return max(int(gunicorn_conf.get("workers", 1)), 1)
+
+
+def get_pool_options(workers: int) -> dict[str, Any]:
+    """Размер пула на один воркер, чтобы суммарно не выйти за DATABASE_MAX_CONNECTIONS"""
+    if not settings.DATABASE_POOL_ENABLED:
+        return {"poolclass": NullPool}
+
+    per_worker = max(settings.DATABASE_MAX_CONNECTIONS // workers, 1)
+    pool_size = min(settings.DATABASE_POOL_SIZE, per_worker)
+    max_overflow = max(min(settings.DATABASE_MAX_OVERFLOW, per_worker - pool_size), 0)
+
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+    }
+
+
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(url, **get_pool_options(get_workers_count()))
+
+
+engine = create_engine(DATABASE_URL)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """
+    Реплики для чтения; реплика с отставанием больше DATABASE_REPLICA_MAX_LAG не используется.
+    Отставание замеряет фоновая задача воркера (start/stop в startup/shutdown), выбор реплики
+    при запросе читает только последние замеры и не ждёт соединения с репликой.
+    """
+
+    def __init__(self, urls: list[str]) -> None:
+        self.engines = [create_engine(url) for url in urls]
+        self._lag: dict[AsyncEngine, tuple[float, float]] = {}  # реплика -> (отставание, monotonic замера)
+        self._task: asyncio.Task | None = None
+
+    def choose(self) -> AsyncEngine | None:
+        if not self.engines:
+            return None
+
+        # Замер старше нескольких интервалов (задача остановлена или зависла) не считается актуальным
+        stale_before = time.monotonic() - 3 * settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL
+        healthy = [
+            replica for replica in self.engines
+            if (measured := self._lag.get(replica)) is not None
+            and measured[1] >= stale_before and measured[0] <= settings.DATABASE_REPLICA_MAX_LAG
+        ]
+        return random.choice(healthy) if healthy else None
+
+    def start(self) -> None:
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="replica-lag-monitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh_lag()
+            await asyncio.sleep(settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL)
+
+    async def refresh_lag(self) -> None:
+        """Замерить отставание всех реплик параллельно; недоступная реплика не задерживает остальные"""
+        await asyncio.gather(*(self._measure(replica) for replica in self.engines))
+
+    async def _measure(self, replica: AsyncEngine) -> None:
+        try:
+            lag = await asyncio.wait_for(self._query_lag(replica), settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL)
+        except Exception as e:
+            logger.warning("Replica %s is unavailable: %s", replica.url.host, e)
+            lag = math.inf
+        self._lag[replica] = (lag, time.monotonic())
+
+    @staticmethod
+    async def _query_lag(replica: AsyncEngine) -> float:
+        async with replica.connect() as conn:
+            return float(await conn.scalar(REPLICA_LAG_QUERY) or 0)
+
+
+replicas = ReplicaSet([str(url) for url in settings.DATABASE_REPLICA_URLS])
+
+
+class RoutingSession(Session):
+    """
+    Чтение - с реплики из info["replica"], запись - в primary.
+    После первой записи сессия до конца запроса работает только с primary (read-your-writes),
+    поэтому refresh после commit видит только что записанные данные.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is None or self.info.get("primary_only"):
+            return engine.sync_engine
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["primary_only"] = True
+            return engine.sync_engine
+
+        return replica.sync_engine
+
+
+def use_primary(session: AsyncSession) -> None:
+    """Дальнейшие запросы сессии - только в primary (для служебных SELECT, которые должны идти в primary)"""
+    session.info["primary_only"] = True
+
+
+routing_session_maker = sessionmaker(engine, class_=AsyncSession, sync_session_class=RoutingSession,
+                                     expire_on_commit=False)
+
+
+def get_pool_stats(db_engine: AsyncEngine = engine) -> dict[str, Any]:
+    pool = db_engine.pool
+    if isinstance(pool, NullPool):
+        return {"pool": "NullPool"}
+
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -24,3 +179,9 @@ async def create_tables():
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+async def get_routing_async_session() -> AsyncGenerator[AsyncSession, None]:
+    replica = replicas.choose()
+    async with routing_session_maker(info={"replica": replica}) as session:
+        yield session
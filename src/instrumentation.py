@@ -0,0 +1,126 @@
+"""
+SQL-статистика запроса: кол-во запросов к базе, суммарное время и самый медленный запрос.
+
+Статистика собирается событиями всех движков SQLAlchemy (primary и реплики) в объект текущего HTTP-запроса
+(contextvar) и отдаётся в заголовке Server-Timing и в логе src.instrumentation (JSON в production).
+В режиме SQL_DEBUG одинаковые запросы, повторённые в одном HTTP-запросе SQL_N_PLUS_ONE_THRESHOLD
+и более раз, логируются как вероятный N+1.
+"""
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_STATEMENT_LENGTH = 500  # символов SQL в логе
+
+
+class RequestQueryStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: str | None = None
+        self.statements: Counter[str] = Counter()
+
+    def add(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+        if settings.SQL_DEBUG:
+            self.statements[statement] += 1
+
+    def repeated_statements(self) -> list[tuple[str, int]]:
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= settings.SQL_N_PLUS_ONE_THRESHOLD]
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.total_time * 1000:.2f};desc="{self.count} queries", '
+                f'db-slowest;dur={self.slowest_time * 1000:.2f}')
+
+
+request_query_stats: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if request_query_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = request_query_stats.get()
+    start_times = conn.info.get("query_start_time")
+    if stats is not None and start_times:
+        stats.add(statement, time.perf_counter() - start_times.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+class SQLInstrumentationMiddleware:
+    """Собирает SQL-статистику HTTP-запроса, добавляет Server-Timing и пишет её в лог"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = request_query_stats.set(stats)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and stats.count:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_query_stats.reset(token)
+            self._log(scope, stats)
+
+    @staticmethod
+    def _log(scope: Scope, stats: RequestQueryStats) -> None:
+        if not stats.count:
+            return
+
+        route = scope.get("route")
+        path = getattr(route, "path", scope["path"])
+        logger.info("SQL %s %s: %d queries, %.2f ms", scope["method"], path, stats.count, stats.total_time * 1000,
+                    extra={
+                        "method": scope["method"],
+                        "path": path,
+                        "query_count": stats.count,
+                        "db_time_ms": round(stats.total_time * 1000, 2),
+                        "slowest_ms": round(stats.slowest_time * 1000, 2),
+                        "slowest_statement": (stats.slowest_statement or "")[:SLOWEST_STATEMENT_LENGTH],
+                    })
+
+        for statement, count in stats.repeated_statements():
+            logger.warning("Possible N+1 in %s %s: statement executed %d times", scope["method"], path, count,
+                           extra={
+                               "method": scope["method"],
+                               "path": path,
+                               "repeat_count": count,
+                               "statement": statement[:SLOWEST_STATEMENT_LENGTH],
+                           })
@@ -0,0 +1,84 @@
+"""
+Мониторинг задержки event loop воркера.
+
+Корутина просыпается каждые LOOP_MONITOR_INTERVAL секунд и измеряет, насколько позже назначенного она получила
+управление (метрика event_loop_lag_seconds). Пока loop заблокирован, корутина выполниться не может,
+поэтому зависание ловит отдельный поток-сторож: если отметка корутины не обновлялась дольше
+LOOP_LAG_THRESHOLD, он пишет в лог стек главного потока - то есть код, который сейчас блокирует loop.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from src.config import settings
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay between scheduled and actual wake-up of the event loop monitor",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+event_loop_stalls = registry.counter(
+    "event_loop_stalls_total", "Event loop blocked longer than LOOP_LAG_THRESHOLD"
+)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, threshold: float) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = loop.create_task(self._measure(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, args=(loop, threading.get_ident()),
+                                          name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            event_loop_lag.observe(max(now - expected, 0))
+            self._heartbeat = now
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        reported_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Одно сообщение на зависание, даже если оно длится несколько проверок
+            reported_heartbeat = heartbeat
+            event_loop_stalls.inc()
+            frame = sys._current_frames().get(loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            task = getattr(asyncio.tasks, "_current_tasks", {}).get(loop)
+            logger.warning("Event loop blocked for %.2fs in task %s:\n%s", blocked_for,
+                           task.get_name() if task else None, stack,
+                           extra={"blocked_seconds": round(blocked_for, 3),
+                                  "task": task.get_name() if task else None})
+
+
+loop_monitor = LoopLagMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_LAG_THRESHOLD)
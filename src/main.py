@@ -1,15 +1,28 @@
-from fastapi import FastAPI, APIRouter
+import asyncio
+import secrets
+from typing import Any
+
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from src.auth.jwt import validate_admin_access
+from src.cache import response_cache
+from src.cache_bus import cache_bus
 from src.config import app_configs, settings
-from src.database import create_tables
+from src.database import create_tables, replicas
+from src.instrumentation import SQLInstrumentationMiddleware
+from src.loop_monitor import loop_monitor
+from src.media.processing import image_pool
+from src.media.resumable import run_upload_gc
+from src.media.uploads import UploadLimitMiddleware
+from src.metrics import MetricsMiddleware, registry
 from src.routers import api_router
 # from src.auth.router import router as auth_router
 # from src.users.router import router as users_router
 # from src.services.router import router as services_router
 # from src.media.router import router as media_router
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 # app = FastAPI(**app_configs, root_path="/api/v2")
 
 app = FastAPI(**app_configs)
@@ -26,6 +39,12 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+if settings.SQL_INSTRUMENTATION_ENABLED:
+    app.add_middleware(SQLInstrumentationMiddleware)
+
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(UploadLimitMiddleware)
+
 app.openapi_url = "/openapi.json"
 
 
@@ -37,6 +56,20 @@ app.openapi_url = "/openapi.json"
 #    return {"status": "ok"}
 
 
+@app.get("/cache/stats", include_in_schema=False, dependencies=[Depends(validate_admin_access)])
+async def cache_stats() -> dict[str, Any]:
+    return response_cache.stats()
+
+
+# Без METRICS_TOKEN маршрут не регистрируется: метрики не отдаются без авторизации на публичном API
+if settings.METRICS_TOKEN:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(authorization: str = Header(None)) -> PlainTextResponse:
+        if not secrets.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/policy", include_in_schema=False)
 async def policy() -> FileResponse:
     return FileResponse("templates/policy.html", media_type="text/html")
@@ -54,7 +87,25 @@ async def user_accept() -> FileResponse:
 
 @app.on_event("startup")
 async def startup_event():
-    pass
+    replicas.start()
+    if settings.RESPONSE_CACHE_ENABLED and settings.CACHE_BUS_ENABLED:
+        cache_bus.start()
+    app.state.metrics_flusher = asyncio.create_task(registry.run_flusher(), name="metrics-flusher")
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    image_pool.start()
+    app.state.upload_gc = asyncio.create_task(run_upload_gc(), name="upload-gc")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    loop_monitor.stop()
+    image_pool.shutdown()
+    app.state.upload_gc.cancel()
+    app.state.metrics_flusher.cancel()
+    registry.flush()  # счётчики завершающегося воркера остаются в сумме по всем воркерам
+    await cache_bus.stop()
+    await replicas.stop()
 
 # @router.get("/perfect-ping")
 # async def perfect_ping():
@@ -0,0 +1,193 @@
+"""
+Замеры обработки изображений.
+
+Запуск: python -m src.media.benchmark pool [--images 32] [--concurrency 8] (scripts/benchmark-image-pool)
+        python -m src.media.benchmark decode [--repeat 5] (scripts/benchmark-image-decode)
+
+pool - задержка event loop (p50/p99) во время загрузки изображений: обработка прямо в loop, как было до пула
+процессов, и через image_pool. Задержка loop - время, на которое каждый параллельный запрос воркера ждёт
+своей очереди; она и даёт прирост p99 ответа API во время загрузок.
+
+decode - время и пиковая память (ru_maxrss) обработки 12 Мп JPEG и HEIC: полное декодирование в исходном
+разрешении, как было до process_image с draft(), и process_image. Каждый замер - в отдельном процессе,
+иначе ru_maxrss процесса покажет максимум предыдущих замеров.
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageOps
+
+from src.media.processing import (
+    INGEST_RENDITIONS,
+    RENDITIONS,
+    _fit_size,
+    _save_atomic,
+    get_resize_dimensions,
+    image_pool,
+    process_image,
+    rendition_path,
+)
+
+PROBE_INTERVAL = 0.005  # период проверки задержки loop, сек
+JPEG_SIZE = (4000, 3000)  # 12 Мп - снимок телефона
+
+
+def _test_image(size: tuple[int, int]) -> Image.Image:
+    """Шум поверх градиента сжимается примерно как фотография"""
+    noise = Image.effect_noise(size, 64).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    return Image.blend(noise, gradient, 0.5)
+
+
+def make_jpeg(file_path: str, size: tuple[int, int] = JPEG_SIZE) -> str:
+    _test_image(size).save(file_path, "JPEG", quality=90)
+    return file_path
+
+
+def make_heic(file_path: str, size: tuple[int, int] = JPEG_SIZE) -> str:
+    _test_image(size).save(file_path, "HEIF", quality=90)
+    return file_path
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def _probe_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def _process_inline(source_path: str, file_path: str) -> None:
+    process_image(source_path, file_path)
+
+
+async def _process_in_pool(source_path: str, file_path: str) -> None:
+    await image_pool.run(process_image, source_path, file_path)
+
+
+async def _measure(process, source_path: str, work_dir: str, images: int, concurrency: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(index: int) -> None:
+        async with semaphore:
+            await process(source_path, os.path.join(work_dir, f"{index}.webp"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(upload(index) for index in range(images)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    return {
+        "images/s": images / elapsed,
+        "lag p50, ms": statistics.median(lags) * 1000,
+        "lag p99, ms": percentile(lags, 0.99) * 1000,
+        "lag max, ms": max(lags) * 1000,
+    }
+
+
+async def benchmark_pool(images: int, concurrency: int) -> None:
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = make_jpeg(os.path.join(work_dir, "source.jpg"))
+        image_pool.start()
+        try:
+            # Прогрев: запуск процессов пула не должен попасть в замер
+            await asyncio.gather(*(_process_in_pool(source_path, os.path.join(work_dir, f"warmup-{index}.webp"))
+                                   for index in range(image_pool.size)))
+            results = {
+                "inline": await _measure(_process_inline, source_path, work_dir, images, concurrency),
+                "pool": await _measure(_process_in_pool, source_path, work_dir, images, concurrency),
+            }
+        finally:
+            image_pool.shutdown()
+
+    print(f"{images} images {JPEG_SIZE[0]}x{JPEG_SIZE[1]}, concurrency {concurrency}, pool size {image_pool.size}")
+    for mode, result in results.items():
+        print(f"{mode:8}" + "  ".join(f"{name} {value:8.1f}" for name, value in result.items()))
+
+
+def process_image_full_decode(source_path: str, file_path: str) -> None:
+    """Прежний путь: декодирование в исходном разрешении, затем уменьшение; результат - те же файлы"""
+    with Image.open(source_path) as im:
+        im.load()
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        im = im.resize(get_resize_dimensions(*im.size))
+
+    _save_atomic(im, file_path, "webp")
+    for size in INGEST_RENDITIONS:
+        copy = im.resize(_fit_size(*im.size, RENDITIONS[size]))
+        _save_atomic(copy, rendition_path(file_path, size, "webp"), "webp")
+
+
+def _run_measured(process, source_path: str, file_path: str) -> tuple[float, int]:
+    """Выполняется в отдельном процессе: время обработки, сек, и пиковая память процесса, КиБ"""
+    started = time.perf_counter()
+    if process is not None:
+        process(source_path, file_path)
+    return time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure_in_process(process, source_path: str, file_path: str) -> tuple[float, int]:
+    with multiprocessing.get_context("forkserver").Pool(1) as pool:
+        return pool.apply(_run_measured, (process, source_path, file_path))
+
+
+def benchmark_decode(repeat: int) -> None:
+    paths = {"full decode": process_image_full_decode, "draft": process_image}
+    # ru_maxrss наследуется через fork и exec: процессы замеров запускаются из forkserver, запущенного
+    # до создания тестовых изображений, а не из этого процесса
+    multiprocessing.forkserver.ensure_running()
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = {
+            "jpeg": make_jpeg(os.path.join(work_dir, "source.jpg")),
+            "heic": make_heic(os.path.join(work_dir, "source.heic")),
+        }
+        # Память процесса после импорта модулей, без обработки - точка отсчёта для ru_maxrss
+        _, base_rss = _measure_in_process(None, sources["jpeg"], os.path.join(work_dir, "none.webp"))
+
+        print(f"{JPEG_SIZE[0]}x{JPEG_SIZE[1]}, repeat {repeat}, process RSS without processing {base_rss // 1024} MiB")
+        for source_format, source_path in sources.items():
+            for name, process in paths.items():
+                results = [
+                    _measure_in_process(process, source_path, os.path.join(work_dir, f"{source_format}-{index}.webp"))
+                    for index in range(repeat)
+                ]
+                wall_time = statistics.median(elapsed for elapsed, _ in results)
+                max_rss = max(rss for _, rss in results)
+                print(f"{source_format:6}{name:13}time {wall_time * 1000:8.1f} ms  "
+                      f"ru_maxrss {max_rss // 1024:6} MiB (+{(max_rss - base_rss) // 1024} MiB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.media.benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pool = commands.add_parser("pool", help="задержка event loop при обработке изображений в loop и в пуле")
+    pool.add_argument("--images", type=int, default=32)
+    pool.add_argument("--concurrency", type=int, default=8)
+    decode = commands.add_parser("decode", help="время и память полного декодирования и draft() для JPEG и HEIC")
+    decode.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "pool":
+        asyncio.run(benchmark_pool(args.images, args.concurrency))
+    elif args.command == "decode":
+        benchmark_decode(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
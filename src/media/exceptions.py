@@ -0,0 +1,59 @@
+from fastapi import status
+
+from src.exceptions import DetailedHTTPException, NotFound, PermissionDenied
+
+
+class ImageQueueFull(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_503_SERVICE_UNAVAILABLE
+    DETAIL = "Сервер перегружен обработкой изображений, повторите загрузку позже"
+
+
+class RangeNotSatisfiable(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    DETAIL = "Запрошенный диапазон за пределами файла"
+
+    def __init__(self, file_size: int) -> None:
+        super().__init__(headers={"Content-Range": f"bytes */{file_size}"})
+
+
+class MediaNotFound(NotFound):
+    DETAIL = "Медиафайл не найден"
+
+
+class MediaLinkInvalid(PermissionDenied):
+    DETAIL = "Ссылка на медиафайл недействительна или устарела"
+
+
+class UploadTooLarge(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    DETAIL = "Слишком большой объём загружаемых файлов"
+
+
+class VideoTooLarge(UploadTooLarge):
+    DETAIL = "Слишком большой видеофайл"
+
+
+class ImageTooLarge(UploadTooLarge):
+    DETAIL = "Слишком большое изображение"
+
+
+class UploadNotFound(NotFound):
+    DETAIL = "Загрузка не найдена или устарела"
+
+
+class TooManyUploads(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_429_TOO_MANY_REQUESTS
+    DETAIL = "Слишком много незавершённых загрузок"
+
+
+class UploadLocked(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_409_CONFLICT
+    DETAIL = "Загрузка уже продолжается в другом запросе"
+
+
+class UploadOffsetConflict(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_409_CONFLICT
+    DETAIL = "Смещение не совпадает с принятым сервером"
+
+    def __init__(self, offset: int) -> None:
+        super().__init__(headers={"Upload-Offset": str(offset)})
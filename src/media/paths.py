@@ -0,0 +1,83 @@
+"""
+Кэш путей медиафайлов в памяти воркера: ключ -> (путь, тип, размер, mtime).
+
+Запись медиафайла после создания не меняется, поэтому путь по ключу можно не запрашивать из базы.
+Кэш заполняется пачкой при отдаче карточки заявки (медиафайлы уже загружены) и при промахе в
+get_media_path_by_key. Размер и mtime узнаются при первой отдаче файла. Записи заявки удаляются
+при инвалидации её области (service_scope) - в том числе в других воркерах через cache_bus.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, NamedTuple
+from uuid import UUID
+
+from src.cache import response_cache, service_scope
+from src.config import settings
+from src.models import FileTypes
+
+
+class MediaPath(NamedTuple):
+    path: str
+    file_type: FileTypes
+    service_id: str
+    size: int | None = None
+    mtime: float | None = None
+
+
+def media_file_path(url: str, file_type: FileTypes) -> str:
+    path_type = "videos" if file_type == FileTypes.VIDEO else "images"
+    return f"./static/{path_type}/{url}"
+
+
+class MediaPathCache:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[UUID, MediaPath] = OrderedDict()
+
+    def get(self, key: UUID) -> MediaPath | None:
+        # Без шины инвалидации удаление в другом воркере может пройти незамеченным
+        if response_cache.bypass:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: UUID, entry: MediaPath) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def remember(self, media_files: Iterable[Any]) -> None:
+        """Запомнить пути загруженных строк MediaFiles (карточка заявки)"""
+        for media_file in media_files:
+            if media_file.id not in self._entries:
+                self.put(media_file.id, MediaPath(media_file_path(media_file.url, media_file.file_type),
+                                                  media_file.file_type, str(media_file.service_id)))
+
+    def stat(self, key: UUID, entry: MediaPath) -> MediaPath:
+        """Запись с размером и mtime файла; FileNotFoundError, если файла нет"""
+        if entry.size is not None:
+            return entry
+        stat = os.stat(entry.path)
+        entry = entry._replace(size=stat.st_size, mtime=stat.st_mtime)
+        if key in self._entries:
+            self._entries[key] = entry
+        return entry
+
+    def evict(self, *keys: UUID) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def _on_invalidate(self, scopes: tuple[Hashable, ...] | None) -> None:
+        if scopes is None:
+            self._entries.clear()
+            return
+        service_ids = {scope[1] for scope in scopes if isinstance(scope, tuple) and scope == service_scope(scope[1])}
+        if service_ids:
+            self.evict(*[key for key, entry in self._entries.items() if entry.service_id in service_ids])
+
+
+media_paths = MediaPathCache(settings.MEDIA_PATH_CACHE_MAX_ENTRIES)
+response_cache.listeners.append(media_paths._on_invalidate)
@@ -0,0 +1,229 @@
+"""
+Обработка загруженных изображений в пуле процессов воркера.
+
+Декодирование, поворот по EXIF, уменьшение и кодирование в WebP занимают CPU на сотни миллисекунд и
+выполняются в отдельных процессах; обработчики запросов только ждут результат. Пул создаётся в каждом
+воркере gunicorn при старте (startup_event), кол-во ожидающих обработки изображений ограничено
+IMAGE_POOL_QUEUE_LIMIT - сверх лимита загрузка ждёт освобождения очереди не дольше IMAGE_POOL_QUEUE_TIMEOUT.
+
+Процессы пула запускаются через forkserver, а не fork: к первому запуску в воркере уже работают потоки
+(мониторинг loop, пулы asyncio и aiofiles) и открыты соединения с базой, которые fork скопировал бы в дочерний
+процесс. Если процесс пула погиб (например, OOM на огромном HEIC), пул пересоздаётся.
+
+Замер задержки event loop при загрузке изображений с пулом и без: python -m src.media.benchmark pool
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image, ImageOps
+from pillow_heif import register_avif_opener, register_heif_opener
+
+from src.config import settings
+from src.media.exceptions import ImageQueueFull
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 274  # EXIF tag for orientation
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}  # ширина и высота меняются местами при повороте
+
+# Register opener for HEIF/HEIC and AVIF formats (один раз на процесс)
+register_heif_opener()
+register_avif_opener()
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS  # предел и для Image.open вне process_image
+
+# Размеры изображения: full - основной файл (MediaFiles.url), остальные - уменьшенные копии с тем же соотношением сторон
+RENDITIONS = {
+    "thumb": (320, 240),
+    "medium": (640, 480),
+    "full": (1280, 960),
+}
+INGEST_RENDITIONS = ("thumb", "medium")  # создаются при загрузке, остальные - при первом запросе
+
+# Формат: (формат Pillow, Content-Type), в порядке предпочтения при согласовании по Accept
+IMAGE_FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+SUPPORTED_FORMATS = [name for name, (pil_format, _) in IMAGE_FORMATS.items() if pil_format in Image.SAVE]
+ORIGINAL_FORMAT = "webp"  # формат основного файла, отдаётся без перекодирования
+
+
+def _parse_accept(accept: str) -> dict[str, float]:
+    """Accept -> {тип: q}; диапазон с некорректным q пропускается"""
+    ranges = {}
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = None
+        if quality is not None:
+            ranges[media_range.lower()] = quality
+    return ranges
+
+
+def negotiate_format(accept: str | None) -> str:
+    """
+    Формат с наибольшим q среди поддерживаемых клиентом; q=0 исключает формат.
+    Явно указанный тип важнее подходящего по image/* или */*; без Accept и только по маске - основной
+    файл (WebP) без перекодирования. Если не подошёл ни один формат - JPEG, его понимают все.
+    """
+    if not accept:
+        return ORIGINAL_FORMAT
+    ranges = _parse_accept(accept)
+
+    candidates = []
+    for name in SUPPORTED_FORMATS:
+        content_type = IMAGE_FORMATS[name][1]
+        explicit = content_type in ranges
+        quality = ranges[content_type] if explicit else ranges.get("image/*", ranges.get("*/*", 0))
+        if quality > 0:
+            candidates.append(((quality, explicit, not explicit and name == ORIGINAL_FORMAT), name))
+    if not candidates:
+        return "jpeg"
+    # max возвращает первый из равных - порядок IMAGE_FORMATS
+    return max(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def rendition_path(original_path: str, size: str, image_format: str) -> str:
+    """Путь копии изображения: <файл>.<size>.<format>; full в WebP - сам загруженный файл"""
+    if size == "full" and image_format == ORIGINAL_FORMAT:
+        return original_path
+    base, _ = os.path.splitext(original_path)
+    return f"{base}.{size}.{image_format}"
+
+
+def _fit_size(width: int, height: int, box: tuple[int, int]) -> tuple[int, int]:
+    scale = min(box[0] / width, box[1] / height, 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def _save_atomic(im: Image.Image, file_path: str, image_format: str) -> None:
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    im.save(tmp_path, format=IMAGE_FORMATS[image_format][0])
+    os.replace(tmp_path, file_path)  # файл появляется целиком
+
+
+def get_resize_dimensions(width: int, height: int) -> tuple[int, int]:
+    aspect_ratio = height / width
+    if aspect_ratio > 0.75:
+        new_height = 960
+        new_width = math.ceil(new_height / aspect_ratio)
+    elif aspect_ratio < 0.75:
+        new_width = 1280
+        new_height = math.ceil(new_width * aspect_ratio)
+    else:
+        new_width = 1280
+        new_height = 960
+    return new_width, new_height
+
+
+def process_image(source_path: str, file_path: str) -> list[str]:
+    """
+    Полная обработка одного изображения за одно декодирование; выполняется в процессе пула.
+    Файл читается с диска (см. stream_upload), а не передаётся в процесс целиком.
+    JPEG декодируется сразу в уменьшенном масштабе (draft, 1/2-1/8), не меньше итогового размера.
+    Изображение больше IMAGE_MAX_PIXELS отклоняется по заголовку, до декодирования.
+    """
+    with Image.open(source_path) as im:
+        if im.width * im.height > settings.IMAGE_MAX_PIXELS:
+            raise Image.DecompressionBombError(f"Image has {im.width * im.height} pixels")
+        orientation = im.getexif().get(ORIENTATION_TAG, 1)
+        transposed = orientation in TRANSPOSED_ORIENTATIONS
+
+        width, height = im.size
+        target_size = get_resize_dimensions(*((height, width) if transposed else (width, height)))
+
+        # Размер для draft - в ориентации, в которой изображение хранится в файле
+        im.draft("RGB", (target_size[1], target_size[0]) if transposed else target_size)
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        # reducing_gap: для форматов без draft сначала быстрое кратное уменьшение, затем точный ресэмплинг
+        im = im.resize(target_size, reducing_gap=3.0)
+
+    _save_atomic(im, file_path, ORIGINAL_FORMAT)
+    renditions = ["full.webp"]
+
+    # Уменьшенные копии - из уже уменьшенного изображения, без повторного декодирования
+    for size in INGEST_RENDITIONS:
+        copy = im.resize(_fit_size(*im.size, RENDITIONS[size]), reducing_gap=2.0)
+        _save_atomic(copy, rendition_path(file_path, size, "webp"), "webp")
+        renditions.append(f"{size}.webp")
+
+    return renditions
+
+
+def render_rendition(original_path: str, size: str, image_format: str) -> str:
+    """Создать недостающую копию изображения из основного файла; выполняется в процессе пула"""
+    file_path = rendition_path(original_path, size, image_format)
+    with Image.open(original_path) as im:
+        im = im.convert("RGB")
+        im = im.resize(_fit_size(*im.size, RENDITIONS[size]), reducing_gap=2.0)
+    _save_atomic(im, file_path, image_format)
+    return file_path
+
+
+class ImageProcessingPool:
+    def __init__(self, size: int, queue_limit: int) -> None:
+        self.size = size
+        self.queue_limit = queue_limit
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+            self._executor = ProcessPoolExecutor(max_workers=self.size, mp_context=context)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size + self.queue_limit)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # Задачи, ожидавшие в том же пуле, получают BrokenProcessPool одновременно - пересоздаёт первая
+        if self._executor is broken:
+            logger.warning("Image processing pool is broken, restarting")
+            self.shutdown()
+            self.start()
+
+    async def run(self, func, *args):
+        self.start()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.IMAGE_POOL_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ImageQueueFull()
+
+        try:
+            # Одна повторная попытка: задача могла оказаться в пуле, который сломала соседняя
+            for attempt in range(2):
+                executor = self._executor
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+                except BrokenProcessPool:
+                    self._restart(executor)
+                    if attempt:
+                        raise
+        finally:
+            self._slots.release()
+
+
+image_pool = ImageProcessingPool(settings.IMAGE_POOL_SIZE, settings.IMAGE_POOL_QUEUE_LIMIT)
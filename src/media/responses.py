@@ -0,0 +1,236 @@
+"""
+Отдача файла с поддержкой HTTP Range (RFC 9110): один диапазон - 206 с Content-Range,
+несколько - 206 multipart/byteranges, недопустимые диапазоны - 416.
+
+Если ASGI-сервер поддерживает расширение http.response.zerocopy, данные передаются через sendfile без
+копирования в память процесса; иначе файл читается небольшими выровненными блоками.
+
+Медиафайлы не изменяются после записи (замена - новый файл с новым ключом), поэтому ETag строится из ключа
+и варианта файла. Условный запрос получает 304 только для существующего ключа (путь - из кэша media_paths):
+If-None-Match сравнивается с ETag, If-Modified-Since (без If-None-Match) - с mtime файла.
+
+Доступ к файлу проверяется подписью ссылки, а не по пользователю, поэтому ответ кэшируется как public
+(браузер, прокси и CDN по полному URL с подписью) не дольше, чем действует ссылка: max-age не больше
+MEDIA_URL_TTL и не позже срока exp.
+
+В режиме MEDIA_OFFLOAD воркер только проверяет доступ и находит путь, а байты (включая Range) отдаёт
+фронтовой сервер по заголовку X-Accel-Redirect или X-Sendfile.
+"""
+import os
+import secrets
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable
+
+import aiofiles
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from src.config import settings
+from src.constants import MediaOffload
+from src.media.exceptions import RangeNotSatisfiable
+
+CHUNK_SIZE = 64 * 1024  # кратно размеру страницы
+MAX_RANGES = 16  # больше диапазонов в одном запросе не обслуживается (отдаётся файл целиком)
+
+ByteRange = tuple[int, int]  # (start, end) включительно
+
+
+def media_etag(key: Any, *variant: str) -> str:
+    """Сильный ETag медиафайла: ключ + вариант (размер, формат)"""
+    return '"' + "-".join([str(key), *variant]) + '"'
+
+
+def is_not_modified(etag: str, if_none_match: str | None, if_modified_since: str | None,
+                    mtime: float | None) -> bool:
+    """
+    Клиентская копия актуальна (RFC 9110, 13.1): ETag совпал со значением If-None-Match (слабое сравнение);
+    If-Modified-Since учитывается только без If-None-Match - файл (mtime) не новее указанной даты.
+    mtime None - файла ещё нет, If-Modified-Since не выполняется.
+    """
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if not if_modified_since or mtime is None:
+        return False
+    try:
+        modified_since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if modified_since.tzinfo is None:
+        return False
+    # Last-Modified передаётся с точностью до секунды
+    return int(mtime) <= modified_since.timestamp()
+
+
+def media_cache_control(expires: int) -> str:
+    """Cache-Control ответа по подписанной ссылке со сроком действия expires (unix time)"""
+    max_age = max(0, min(settings.MEDIA_URL_TTL, expires - int(time.time())))
+    return f"public, max-age={max_age}, immutable"
+
+
+def not_modified_response(etag: str, expires: int, headers: dict[str, str] | None = None) -> Response:
+    return Response(status_code=304,
+                    headers={"ETag": etag, "Cache-Control": media_cache_control(expires), **(headers or {})})
+
+
+def media_cache_headers(etag: str, mtime: float, expires: int) -> dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": media_cache_control(expires),
+    }
+
+
+def offload_response(path: str, media_type: str, headers: dict[str, str] | None = None) -> Response:
+    """Пустой ответ, тело которого по заголовку отдаёт фронтовой сервер (settings.MEDIA_OFFLOAD)"""
+    if settings.MEDIA_OFFLOAD == MediaOffload.X_ACCEL_REDIRECT:
+        location = settings.MEDIA_OFFLOAD_PREFIX + os.path.relpath(path, "./static")
+    else:
+        location = os.path.abspath(path)
+    return Response(media_type=media_type, headers={settings.MEDIA_OFFLOAD.value: location, **(headers or {})})
+
+
+def parse_range_header(range_header: str | None, file_size: int) -> list[ByteRange] | None:
+    """
+    Диапазоны из заголовка Range; None - заголовок отсутствует или некорректен (отдаётся весь файл).
+    Пересекающиеся и соседние диапазоны объединяются. Если ни один диапазон не попадает в файл - 416.
+    """
+    if not range_header:
+        return None
+
+    unit, _, specs = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        start_str, dash, end_str = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not start_str:
+                # bytes=-500 - последние 500 байт
+                suffix = int(end_str)
+                if suffix <= 0:
+                    continue
+                start, end = max(file_size - suffix, 0), file_size - 1
+            else:
+                start = int(start_str)
+                end = int(end_str) if end_str else file_size - 1
+                if end < start:
+                    return None
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < file_size:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable(file_size)
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: list[ByteRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class FileRangeResponse(Response):
+    def __init__(
+            self,
+            path: str,
+            file_size: int,
+            ranges: list[ByteRange] | None,
+            media_type: str,
+            headers: dict[str, str] | None = None,
+            on_bytes_sent: Callable[[int], None] | None = None
+    ) -> None:
+        self.path = path
+        self.file_size = file_size
+        self.media_type = media_type
+        self.on_bytes_sent = on_bytes_sent
+        self.parts: list[tuple[bytes, int, int]] = []  # (заголовок части, start, end)
+        self.trailer = b""
+
+        if ranges is None:
+            self.status_code = 200
+            self.ranges = [(0, file_size - 1)] if file_size else []
+            content_type = media_type
+            content_length = file_size
+        elif len(ranges) == 1:
+            self.status_code = 206
+            self.ranges = ranges
+            content_type = media_type
+            content_length = ranges[0][1] - ranges[0][0] + 1
+        else:
+            self.status_code = 206
+            self.ranges = ranges
+            boundary = secrets.token_hex(16)
+            content_type = f"multipart/byteranges; boundary={boundary}"
+            for start, end in ranges:
+                part_header = (f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                               f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n").encode()
+                self.parts.append((part_header, start, end))
+            self.trailer = f"--{boundary}--\r\n".encode()
+            content_length = sum(len(header) + end - start + 1 + 2 for header, start, end in self.parts)
+            content_length += len(self.trailer)
+
+        self.init_headers({"Accept-Ranges": "bytes", **(headers or {})})
+        self.headers["Content-Type"] = content_type
+        self.headers["Content-Length"] = str(content_length)
+        if self.status_code == 206 and len(self.ranges) == 1:
+            start, end = self.ranges[0]
+            self.headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zerocopy = "http.response.zerocopy" in scope.get("extensions", {})
+        segments = [(header, start, end) for header, start, end in self.parts] if self.parts else \
+            [(b"", start, end) for start, end in self.ranges]
+
+        if zerocopy:
+            with open(self.path, "rb") as file:
+                for header, start, end in segments:
+                    if header:
+                        await send({"type": "http.response.body", "body": header, "more_body": True})
+                    await send({"type": "http.response.zerocopy", "file": file, "offset": start,
+                                "count": end - start + 1, "more_body": True})
+                    self._sent(end - start + 1)
+                    if self.parts:
+                        await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        else:
+            async with aiofiles.open(self.path, "rb") as file:
+                for header, start, end in segments:
+                    if header:
+                        await send({"type": "http.response.body", "body": header, "more_body": True})
+                    await file.seek(start)
+                    remaining = end - start + 1
+                    # Первый блок дочитывается до границы CHUNK_SIZE, дальше чтение выровнено
+                    chunk_size = CHUNK_SIZE - start % CHUNK_SIZE
+                    while remaining > 0:
+                        chunk = await file.read(min(chunk_size, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        chunk_size = CHUNK_SIZE
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                        self._sent(len(chunk))
+                    if self.parts:
+                        await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+
+        await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+
+    def _sent(self, count: int) -> None:
+        if self.on_bytes_sent:
+            self.on_bytes_sent(count)
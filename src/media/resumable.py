@@ -0,0 +1,210 @@
+"""
+Возобновляемая загрузка видео по протоколу tus 1.0 (core + creation, termination, expiration).
+
+Клиент создаёт загрузку (POST с Upload-Length), отправляет тело частями (PATCH с Upload-Offset),
+после обрыва узнаёт принятое смещение (HEAD) и продолжает с него. Завершённая загрузка передаётся
+в /services/create или /services/verify полем video_upload_id вместо файла и переносится к видео заявки.
+
+Состояние хранится на диске (RESUMABLE_UPLOADS_DIR, вне static): <id>.part - принятые байты
+(смещение = размер файла), <id>.json - владелец, размер и расширение. Так продолжить загрузку можно
+через любой воркер. У пользователя не больше RESUMABLE_UPLOAD_MAX_PER_USER незавершённых загрузок.
+Загрузки без активности дольше RESUMABLE_UPLOAD_EXPIRY удаляются фоновой задачей воркера.
+"""
+import asyncio
+import base64
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import aiofiles
+
+from src.config import settings
+from src.media.exceptions import (
+    TooManyUploads,
+    UploadLocked,
+    UploadNotFound,
+    UploadOffsetConflict,
+    UploadTooLarge,
+    VideoTooLarge,
+)
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+
+
+class ResumableUpload:
+    def __init__(self, upload_id: uuid.UUID, user_id: int, length: int, extension: str) -> None:
+        self.id = upload_id
+        self.user_id = user_id
+        self.length = length
+        self.extension = extension
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(settings.RESUMABLE_UPLOADS_DIR, f"{self.id}.part")
+
+    @property
+    def info_path(self) -> str:
+        return os.path.join(settings.RESUMABLE_UPLOADS_DIR, f"{self.id}.json")
+
+    @property
+    def size(self) -> int:
+        """Как у UploadFile - для validate_upload_sizes"""
+        return self.length
+
+    @property
+    def offset(self) -> int:
+        return os.path.getsize(self.part_path)
+
+    @property
+    def expires_at(self) -> float:
+        return os.path.getmtime(self.part_path) + settings.RESUMABLE_UPLOAD_EXPIRY
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.length
+
+    def remove(self) -> None:
+        Path(self.part_path).unlink(missing_ok=True)
+        Path(self.info_path).unlink(missing_ok=True)
+
+
+def _parse_metadata(upload_metadata: str | None) -> dict[str, str]:
+    """Upload-Metadata: пары "ключ base64(значение)" через запятую"""
+    metadata = {}
+    for pair in (upload_metadata or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ""
+        except ValueError:
+            continue
+    return metadata
+
+
+def _read_info(info_path: str) -> dict:
+    with open(info_path) as f:
+        return json.load(f)
+
+
+def _user_upload_count(user_id: int) -> int:
+    """Кол-во незавершённых загрузок пользователя (перенесённые к заявке и удалённые не считаются)"""
+    count = 0
+    for entry in os.scandir(settings.RESUMABLE_UPLOADS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            if _read_info(entry.path)["user_id"] != user_id:
+                continue
+        except (OSError, ValueError, KeyError):
+            continue
+        count += os.path.exists(os.path.join(settings.RESUMABLE_UPLOADS_DIR, f"{Path(entry.name).stem}.part"))
+    return count
+
+
+def create_upload(user_id: int, length: int, upload_metadata: str | None) -> ResumableUpload:
+    if length > settings.UPLOAD_MAX_VIDEO_SIZE:
+        raise VideoTooLarge()
+
+    Path(settings.RESUMABLE_UPLOADS_DIR).mkdir(parents=True, exist_ok=True)
+    if _user_upload_count(user_id) >= settings.RESUMABLE_UPLOAD_MAX_PER_USER:
+        raise TooManyUploads()
+
+    filename = _parse_metadata(upload_metadata).get("filename", "")
+    extension = os.path.splitext(os.path.basename(filename))[1][:10] or ".mp4"
+    upload = ResumableUpload(uuid.uuid4(), user_id, length, extension)
+
+    Path(upload.part_path).touch()
+    with open(upload.info_path, "w") as f:
+        json.dump({"user_id": user_id, "length": length, "extension": extension}, f)
+    return upload
+
+
+def get_upload(upload_id: uuid.UUID, user_id: int) -> ResumableUpload:
+    """Загрузка пользователя; чужая или удалённая - UploadNotFound"""
+    try:
+        info = _read_info(os.path.join(settings.RESUMABLE_UPLOADS_DIR, f"{upload_id}.json"))
+        upload = ResumableUpload(upload_id, info["user_id"], info["length"], info["extension"])
+    except (OSError, ValueError, KeyError):
+        raise UploadNotFound()
+
+    # .part может быть уже удалён сборщиком или перенесён к заявке
+    if upload.user_id != user_id or not os.path.exists(upload.part_path):
+        raise UploadNotFound()
+    return upload
+
+
+def get_completed_upload(upload_id: uuid.UUID | None, user_id: int) -> ResumableUpload | None:
+    if upload_id is None:
+        return None
+    upload = get_upload(upload_id, user_id)
+    if not upload.is_complete:
+        raise UploadOffsetConflict(upload.offset)
+    return upload
+
+
+async def append_chunk(upload: ResumableUpload, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """
+    Дописать часть тела с заданного смещения; возвращает новое смещение.
+    Одновременный PATCH той же загрузки (повтор клиента после таймаута) получает 409 UploadLocked.
+    """
+    async with aiofiles.open(upload.part_path, "ab") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadLocked()
+
+        current_offset = upload.offset
+        if offset != current_offset:
+            raise UploadOffsetConflict(current_offset)
+
+        # Обрыв соединения в середине части: принятые байты остаются, клиент продолжит с нового смещения
+        async for chunk in chunks:
+            if current_offset + len(chunk) > upload.length:
+                raise UploadTooLarge()
+            await f.write(chunk)
+            current_offset += len(chunk)
+
+    return current_offset
+
+
+def remove_expired_uploads(now: float | None = None) -> int:
+    """Удалить загрузки, не получавшие данных дольше RESUMABLE_UPLOAD_EXPIRY"""
+    uploads_dir = settings.RESUMABLE_UPLOADS_DIR
+    if not os.path.isdir(uploads_dir):
+        return 0
+
+    deadline = (now if now is not None else time.time()) - settings.RESUMABLE_UPLOAD_EXPIRY
+    removed = 0
+    for entry in os.scandir(uploads_dir):
+        try:
+            if entry.stat().st_mtime >= deadline:
+                continue
+            # .json не меняется после создания, поэтому срок отсчитывается от .part
+            part_path = os.path.join(uploads_dir, f"{Path(entry.name).stem}.part")
+            if entry.name.endswith(".json") and os.path.exists(part_path):
+                continue
+            os.remove(entry.path)
+            removed += entry.name.endswith(".part")
+        except FileNotFoundError:
+            continue  # удалён сборщиком другого воркера
+    return removed
+
+
+async def run_upload_gc() -> None:
+    while True:
+        await asyncio.sleep(settings.RESUMABLE_UPLOAD_GC_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(remove_expired_uploads)
+        except OSError as e:
+            logger.warning("Expired uploads cleanup failed: %s", e)
+            continue
+        if removed:
+            logger.info("Removed %d expired uploads", removed)
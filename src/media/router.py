@@ -1,83 +1,172 @@
+import asyncio
 import os
+from email.utils import formatdate
 from pathlib import Path
-from typing import Tuple
 from uuid import UUID
 
-import aiofiles
-from fastapi import APIRouter, Depends, HTTPException, Header
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import status
+from starlette.requests import ClientDisconnect
 
-from src.auth.jwt import validate_users_access
+from src.auth.jwt import parse_jwt_user_data, validate_users_access
+from src.auth.schemas import JWTData
+from src.config import settings
 from src.database import get_async_session
-from src.media import service as media_services
-from src.media.service import DEFAULT_CHUNK_SIZE
+from src.media import resumable, service as media_services
+from src.media.exceptions import MediaNotFound
+from src.media.paths import media_paths
+from src.media.processing import IMAGE_FORMATS, image_pool, negotiate_format, render_rendition, rendition_path
+from src.media.responses import FileRangeResponse, is_not_modified, media_cache_headers, media_etag, \
+    not_modified_response, offload_response, parse_range_header
+from src.media.signing import VIDEO_VARIANT, verify_signature
+from src.metrics import video_bytes_sent
 from src.models import FileTypes
 
 router = APIRouter()
 
 
-def parse_range_header(range_header: str, total_size: int) -> Tuple[int, int]:
-    unit, ranges = range_header.split("=")
-    start, end = ranges.split("-")
-    start = int(start) if start else 0
-    end = int(end) if end else total_size - 1
-    return start, end
-
-
 # @router.get("/video/{key}", response_class=StreamingResponse, dependencies=[Depends(validate_users_access)])
-@router.get("/video/{key}", response_class=StreamingResponse)
+@router.get("/video/{key}", response_class=FileRangeResponse)
 async def get_video(
         key: UUID,
-        range_header: str = Header(None),
+        exp: int = Query(None, description="Срок действия ссылки (unix time)"),
+        sig: str = Query(None, description="Подпись ссылки"),
+        range_header: str = Header(None, alias="Range"),
+        if_none_match: str = Header(None),
+        if_modified_since: str = Header(None),
         session: AsyncSession = Depends(get_async_session)
-) -> StreamingResponse:
+) -> Response:
+
+    verify_signature(key, VIDEO_VARIANT, exp, sig)
 
-    media_type = FileTypes.VIDEO
-    file_path = await media_services.get_media_path_by_key(key, media_type, session)
+    media_path = await media_services.get_media_path_by_key(key, FileTypes.VIDEO, session)
+    if media_path is None:
+        raise MediaNotFound()
 
-    if not Path(file_path).is_file():
+    try:
+        media_path = media_paths.stat(key, media_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Видео не найдено")
 
-    file_size = os.path.getsize(file_path)
-    headers = {
-        "Accept-Ranges": "bytes",
-        "Content-Type": "video/mp4",
-        "Content-Length": str(file_size)
-    }
+    etag = media_etag(key)
+    if is_not_modified(etag, if_none_match, if_modified_since, media_path.mtime):
+        return not_modified_response(etag, exp)
 
-    if range_header:
-        start, end = parse_range_header(range_header, file_size)
-        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
-        status_code = status.HTTP_206_PARTIAL_CONTENT
-    else:
-        status_code = status.HTTP_200_OK
+    if settings.MEDIA_OFFLOAD:
+        return offload_response(media_path.path, "video/mp4", headers=media_cache_headers(etag, media_path.mtime, exp))
 
-    async def stream_file():
-        async with aiofiles.open(file_path, "rb") as f:
-            while chunk := await f.read(DEFAULT_CHUNK_SIZE):
-                yield chunk
+    ranges = parse_range_header(range_header, media_path.size)
 
-    return StreamingResponse(
-        stream_file(),
-        status_code=status_code,
-        headers=headers,
-        media_type="video/mp4"
-    )
+    return FileRangeResponse(media_path.path, media_path.size, ranges, media_type="video/mp4",
+                             headers=media_cache_headers(etag, media_path.mtime, exp),
+                             on_bytes_sent=video_bytes_sent.inc)
 
 
 # @router.get("/image/{key}", response_class=FileResponse, dependencies=[Depends(validate_users_access)])
 @router.get("/image/{key}", response_class=FileResponse)
 async def get_image(
         key: UUID,
+        size: str = Query("full", description="Размер изображения", regex="^(thumb|medium|full)$"),
+        exp: int = Query(None, description="Срок действия ссылки (unix time)"),
+        sig: str = Query(None, description="Подпись ссылки"),
+        accept: str = Header(None),
+        if_none_match: str = Header(None),
+        if_modified_since: str = Header(None),
         session: AsyncSession = Depends(get_async_session)
-) -> FileResponse:
-
-    media_type = FileTypes.IMAGE
-    file_path = await media_services.get_media_path_by_key(key, media_type, session)
+) -> Response:
+
+    verify_signature(key, size, exp, sig)
+
+    media_path = await media_services.get_media_path_by_key(key, FileTypes.IMAGE, session)
+    if media_path is None:
+        raise MediaNotFound()
+
+    # Формат по заголовку Accept; недостающая копия создаётся один раз и остаётся на диске
+    image_format = negotiate_format(accept)
+    etag = media_etag(key, size, image_format)
+    rendition = rendition_path(media_path.path, size, image_format)
+    try:
+        stat = os.stat(rendition)
+    except FileNotFoundError:
+        stat = None
+
+    if is_not_modified(etag, if_none_match, if_modified_since, stat.st_mtime if stat else None):
+        return not_modified_response(etag, exp, headers={"Vary": "Accept"})
+
+    if stat is None:
+        if not Path(media_path.path).is_file():
+            raise HTTPException(status_code=404, detail="Изображение не найдено")
+        rendition = await image_pool.run(render_rendition, media_path.path, size, image_format)
+        stat = os.stat(rendition)
+        await media_services.record_rendition(key, f"{size}.{image_format}", session)
+
+    if settings.MEDIA_OFFLOAD:
+        return offload_response(rendition, IMAGE_FORMATS[image_format][1],
+                                headers={"Vary": "Accept", **media_cache_headers(etag, stat.st_mtime, exp)})
+
+    return FileResponse(path=rendition, media_type=IMAGE_FORMATS[image_format][1], stat_result=stat,
+                        headers={"Vary": "Accept", **media_cache_headers(etag, stat.st_mtime, exp)})
+
+
+def _tus_headers(upload: resumable.ResumableUpload) -> dict[str, str]:
+    return {
+        "Tus-Resumable": resumable.TUS_VERSION,
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Upload-Expires": formatdate(upload.expires_at, usegmt=True),
+        "Cache-Control": "no-store",
+    }
 
-    if not Path(file_path).is_file():
-        raise HTTPException(status_code=404, detail="Изображение не найдено")
 
-    return FileResponse(path=file_path, media_type="image/webp")
+@router.post("/uploads", status_code=201)
+async def create_upload(
+        request: Request,
+        upload_length: int = Header(..., ge=0),
+        upload_metadata: str = Header(None),
+        current_user: JWTData = Depends(parse_jwt_user_data)
+) -> Response:
+    """Создать возобновляемую загрузку видео (tus creation); Location - адрес для PATCH/HEAD"""
+    upload = await asyncio.to_thread(resumable.create_upload, int(current_user.user_id), upload_length,
+                                     upload_metadata)
+    location = request.url_for("get_upload_offset", upload_id=upload.id).path
+    return Response(status_code=201, headers={"Location": location, **_tus_headers(upload)})
+
+
+@router.head("/uploads/{upload_id}", name="get_upload_offset")
+async def get_upload_offset(
+        upload_id: UUID,
+        current_user: JWTData = Depends(parse_jwt_user_data)
+) -> Response:
+    upload = resumable.get_upload(upload_id, int(current_user.user_id))
+    return Response(headers=_tus_headers(upload))
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def append_upload(
+        upload_id: UUID,
+        request: Request,
+        upload_offset: int = Header(..., ge=0),
+        content_type: str = Header(None),
+        current_user: JWTData = Depends(parse_jwt_user_data)
+) -> Response:
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Ожидается Content-Type: application/offset+octet-stream")
+
+    upload = resumable.get_upload(upload_id, int(current_user.user_id))
+    try:
+        await resumable.append_chunk(upload, upload_offset, request.stream())
+    except ClientDisconnect:
+        # Принятые байты сохранены, клиент узнает смещение через HEAD
+        return Response(status_code=400)
+    return Response(status_code=204, headers=_tus_headers(upload))
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(
+        upload_id: UUID,
+        current_user: JWTData = Depends(parse_jwt_user_data)
+) -> Response:
+    upload = resumable.get_upload(upload_id, int(current_user.user_id))
+    upload.remove()
+    return Response(status_code=204, headers={"Tus-Resumable": resumable.TUS_VERSION})
@@ -1,75 +1,94 @@
-import io
-import math
+import asyncio
 import os
+import shutil
 import uuid
 from pathlib import Path
 from typing import List
 
-import aiofiles
 from fastapi import UploadFile
-
 from PIL import Image
-from pillow_heif import register_heif_opener
 
+from src.cache import invalidate_after_commit, service_scope
+from src.config import settings
 from src.database import engine
+from src.media.exceptions import ImageQueueFull, ImageTooLarge, UploadNotFound, UploadTooLarge
+from src.media.paths import MediaPath, media_file_path, media_paths
+from src.media.processing import image_pool, process_image
+from src.media.resumable import ResumableUpload
+from src.media.uploads import file_sha256, stream_upload
+from src.metrics import image_processing_duration
 from src.models import OwnerTypes
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import String, cast, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models import FileTypes, MediaFiles
 
-DEFAULT_CHUNK_SIZE = 1024 * 1024 * 20  # 20 megabytes
 
+async def get_media_path_by_key(key: UUID, media_type: FileTypes, session: AsyncSession) -> MediaPath | None:
+    entry = media_paths.get(key)
+    if entry is None:
+        select_query = select(MediaFiles.url, MediaFiles.file_type, MediaFiles.service_id).where(MediaFiles.id == key)
+        row = (await session.execute(select_query)).one_or_none()
+        if row is None:
+            return None
+        entry = MediaPath(media_file_path(row.url, row.file_type), row.file_type, str(row.service_id))
+        media_paths.put(key, entry)
+
+    return entry if entry.file_type == media_type else None
 
-async def get_media_path_by_key(key: UUID, media_type: FileTypes, session: AsyncSession):
-    select_query = select(MediaFiles).where(MediaFiles.id == key, MediaFiles.file_type == media_type)
-    model = await session.execute(select_query)
-    media_file = model.scalar_one_or_none()
-    path_type = "videos" if media_type == FileTypes.VIDEO else "images"
-    url = f"./static/{path_type}/{media_file.url}"
-    return url
 
+async def save_video(video_file: UploadFile | ResumableUpload, service_id: uuid.UUID, owner_type: OwnerTypes):
+    if isinstance(video_file, ResumableUpload):
+        return await save_uploaded_video(video_file, service_id, owner_type)
 
-async def save_video(video_file: UploadFile, service_id: uuid.UUID, owner_type: OwnerTypes):
     filename, file_extension = os.path.splitext(video_file.filename)
     file_name = str(uuid.uuid4()) + str(file_extension)
     road = service_id
 
     url = f"{road}/{file_name}"  # Относительный Путь для записи в БД
-
-    Path(f"./static/videos/{road}").mkdir(parents=True, exist_ok=True)
     file_path = f"./static/videos/{url}"  # Полный путь до файла, для сохранения на сервере
 
-    saved_to_folder = await save_video_to_folder(video_file, file_path)
-    if not saved_to_folder:
-        raise
+    _, sha256 = await stream_upload(video_file, file_path, settings.UPLOAD_MAX_VIDEO_SIZE)
 
     # SAVE FILE TO DATABASE
-    saved_to_db = await save_video_to_db(url, service_id, owner_type)
+    saved_to_db = await save_video_to_db(url, service_id, owner_type, sha256)
 
     return saved_to_db
 
 
-async def save_video_to_folder(video_file: UploadFile, file_path: str) -> bool:
-    async with aiofiles.open(file_path, "wb") as f:
-        while chunk := await video_file.read(DEFAULT_CHUNK_SIZE):
-            await f.write(chunk)
+async def save_uploaded_video(upload: ResumableUpload, service_id: uuid.UUID, owner_type: OwnerTypes):
+    """Перенести завершённую возобновляемую загрузку к видео заявки (без копирования данных)"""
+    file_name = str(uuid.uuid4()) + upload.extension
+    url = f"{service_id}/{file_name}"
+    file_path = f"./static/videos/{url}"
 
-    return True
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # Переименование - атомарный захват загрузки: повторная передача того же id (в том числе
+        # одновременная) не находит .part
+        os.replace(upload.part_path, file_path)
+    except FileNotFoundError:
+        raise UploadNotFound()
+    upload.remove()
+    sha256 = await asyncio.to_thread(file_sha256, file_path)
+
+    return await save_video_to_db(url, service_id, owner_type, sha256)
 
 
-async def save_video_to_db(url: str, service_id: uuid.UUID, owner_type: OwnerTypes):
+async def save_video_to_db(url: str, service_id: uuid.UUID, owner_type: OwnerTypes, sha256: str = None):
     async with AsyncSession(engine) as session:
         video_object = MediaFiles(
             id=uuid.uuid4(),
             service_id=service_id,
             file_type=FileTypes.VIDEO,
             owner_type=owner_type,
-            url=url
+            url=url,
+            sha256=sha256
         )
         session.add(video_object)
+        invalidate_after_commit(session, service_scope(service_id))
         await session.commit()
         await session.refresh(video_object)
         return True
@@ -80,86 +99,69 @@ async def save_images(image_files, service_id, owner_type):
         road = service_id
 
         for image in image_files:
-            image_content = image.file.read()
-
-            # Register opener for HEIF/HEIC format
-            register_heif_opener()
-
-            orientation_value = get_image_orientation(image_content)
-
-            im = Image.open(io.BytesIO(image_content))
-            # Convert to RGB if needed
-            im = im.convert("RGB")
-
-            if orientation_value == 3:
-                im = im.rotate(180, expand=True)
-            elif orientation_value == 6:
-                im = im.rotate(-90, expand=True)
-            elif orientation_value == 8:
-                im = im.rotate(90, expand=True)
-
             file_name = uuid.uuid4()
+            file_path = f"./static/images/{road}/{file_name}.webp"
 
-            await save_image_to_folder(im, road, file_name)
+            # Исходный файл - на диск рядом с результатом, в память воркера он не читается
+            upload_path = f"./static/images/{road}/{file_name}.upload"
+            _, sha256 = await stream_upload(image, upload_path, settings.UPLOAD_MAX_IMAGE_SIZE)
+
+            # Обработка в пуле процессов, event loop воркера не блокируется
+            try:
+                with image_processing_duration.time():
+                    renditions = await image_pool.run(process_image, upload_path, file_path)
+            except Image.DecompressionBombError:
+                raise ImageTooLarge()
+            finally:
+                Path(upload_path).unlink(missing_ok=True)
 
             url = f"{road}/{file_name}.webp"
-            await save_image_to_db(url, service_id, owner_type)
+            await save_image_to_db(url, service_id, owner_type, renditions, sha256)
 
         return True
+    except (ImageQueueFull, UploadTooLarge):
+        raise
     except Exception as e:
         print('error', str(e))
         return False
 
 
-def get_image_orientation(image_content):
-    orientation_value = 1  # Default orientation (normal)
-    with io.BytesIO(image_content) as f:
-        im = Image.open(f)
-        if hasattr(im, '_getexif'):
-            exif = im._getexif()
-            if exif is not None:
-                orientation_tag = 274  # EXIF tag for orientation
-                orientation_value = exif.get(orientation_tag, 1)
-    return orientation_value
-
-
-async def make_image_resize(image):
-    width, height = image.size
-    aspect_ratio = height / width
-    if aspect_ratio > 0.75:
-        new_height = 960
-        new_width = math.ceil(new_height / aspect_ratio)
-    elif aspect_ratio < 0.75:
-        new_width = 1280
-        new_height = math.ceil(new_width * aspect_ratio)
-    else:
-        new_width = 1280
-        new_height = 960
-    im1 = image.resize((new_width, new_height))
-    return im1
-
-
-async def save_image_to_folder(image, road, file_name):
-    im1 = await make_image_resize(image)
-    Path(f"./static/images/{road}").mkdir(parents=True, exist_ok=True)
-    im1.save(f"./static/images/{road}/{file_name}.webp", format="webp")
-
-
-async def save_image_to_db(url: str, service_id: uuid.UUID, owner_type: OwnerTypes):
+async def save_image_to_db(url: str, service_id: uuid.UUID, owner_type: OwnerTypes, renditions: List[str] = None,
+                           sha256: str = None):
     async with AsyncSession(engine) as session:
         image_object = MediaFiles(
             id=uuid.uuid4(),
             service_id=service_id,
             file_type=FileTypes.IMAGE,
             owner_type=owner_type,
-            url=url
+            url=url,
+            renditions=renditions or [],
+            sha256=sha256
         )
         session.add(image_object)
+        invalidate_after_commit(session, service_scope(service_id))
         await session.commit()
         await session.refresh(image_object)
         return True
 
 
+async def record_rendition(key: UUID, rendition: str, session: AsyncSession) -> None:
+    """Добавить копию, созданную при первом запросе ("medium.avif", ...), в MediaFiles.renditions"""
+    await session.execute(
+        update(MediaFiles)
+        .where(MediaFiles.id == key, ~MediaFiles.renditions.contains([rendition]))
+        .values(renditions=MediaFiles.renditions.op("||")(func.jsonb_build_array(cast(rendition, String))))
+    )
+    await session.commit()
+
+
+async def remove_service_media_dirs(service_id: UUID) -> None:
+    """Удалить каталоги файлов заявки (видео, изображения и их копии)"""
+    for file_type in (FileTypes.VIDEO, FileTypes.IMAGE):
+        directory = Path(media_file_path(str(service_id), file_type))
+        await asyncio.to_thread(shutil.rmtree, directory, ignore_errors=True)
+
+
 async def remove_unused_media_files(service_id: UUID, old_files: List[str], session: AsyncSession):
     select_query = select(MediaFiles).where(MediaFiles.service_id == service_id, MediaFiles.owner_type == OwnerTypes.CUSTOMER)
     model = await session.execute(select_query)
@@ -182,10 +184,13 @@ async def remove_unused_media_files(service_id: UUID, old_files: List[str], sess
             # DELETE MEDIA FILE with ID = media_file.id
             await session.delete(media_file)
 
-            path_type = "videos" if media_file.file_type == FileTypes.VIDEO else "images"
-            file_path = f"./static/{path_type}/{media_file.url}"
+            file_path = media_file_path(media_file.url, media_file.file_type)
             if os.path.exists(file_path):
                 os.remove(file_path)
+            if media_file.file_type == FileTypes.IMAGE:
+                # Копии изображения других размеров и форматов: <файл>.<size>.<format>
+                for rendition in Path(file_path).parent.glob(f"{Path(file_path).stem}.*.*"):
+                    rendition.unlink(missing_ok=True)
 
             deleted_counter += 1
         else:
@@ -193,6 +198,7 @@ async def remove_unused_media_files(service_id: UUID, old_files: List[str], sess
             image_counter += 1 if media_file.file_type == FileTypes.IMAGE else 0
 
     if deleted_counter > 0:
+        invalidate_after_commit(session, service_scope(service_id))
         await session.commit()
 
     # print('old_files:', old_files)
@@ -0,0 +1,63 @@
+"""
+Подписанные ссылки на медиафайлы: HMAC-SHA256 от ключа, варианта (размер изображения или video) и срока действия.
+
+Проверка подписи не требует JWT и обращения к базе, поэтому выполняется до любых других действий в роутере.
+Срок действия округляется вверх до границы окна MEDIA_URL_TTL: в пределах окна ссылка на файл одна и та же,
+и её ответ кэшируют браузер и прокси.
+
+Путь ссылки берётся из маршрутов get_image / get_video (src/routers.py), а не задаётся здесь повторно.
+"""
+import base64
+import functools
+import hashlib
+import hmac
+import time
+from typing import Any
+
+from src.auth.config import auth_config
+from src.config import settings
+from src.media.exceptions import MediaLinkInvalid
+
+VIDEO_VARIANT = "video"
+
+_secret = (settings.MEDIA_URL_SECRET or auth_config.JWT_SECRET).encode()
+
+
+def _signature(key: Any, variant: str, expires: int) -> str:
+    digest = hmac.new(_secret, f"{key}:{variant}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _expires_at(now: float | None = None) -> int:
+    ttl = settings.MEDIA_URL_TTL
+    # Не меньше одного полного окна до истечения
+    return (int(now if now is not None else time.time()) // ttl + 2) * ttl
+
+
+@functools.cache
+def _route_path(name: str) -> str:
+    """Шаблон пути маршрута с префиксами, например /api/v2/media/image/{key}"""
+    # src.routers импортирует роутер медиафайлов, а он - этот модуль; к первой подписи ссылки импорт завершён
+    from src.routers import api_router
+    return next(route.path for route in api_router.routes if route.name == name)
+
+
+def sign_image_url(key: Any, size: str) -> str:
+    expires = _expires_at()
+    path = _route_path("get_image").format(key=key)
+    return f"{path}?size={size}&exp={expires}&sig={_signature(key, size, expires)}"
+
+
+def sign_video_url(key: Any) -> str:
+    expires = _expires_at()
+    path = _route_path("get_video").format(key=key)
+    return f"{path}?exp={expires}&sig={_signature(key, VIDEO_VARIANT, expires)}"
+
+
+def verify_signature(key: Any, variant: str, expires: int | None, signature: str | None) -> None:
+    if expires is None or not signature:
+        raise MediaLinkInvalid()
+    if expires < time.time():
+        raise MediaLinkInvalid()
+    if not hmac.compare_digest(_signature(key, variant, expires), signature):
+        raise MediaLinkInvalid()
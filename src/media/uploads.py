@@ -0,0 +1,202 @@
+"""
+Приём загружаемых файлов с ограничением размера.
+
+UploadLimitMiddleware отклоняет multipart-запрос больше UPLOAD_MAX_REQUEST_SIZE с 413 до чтения тела
+(по Content-Length) или как только полученные байты превысят лимит (chunked). Лимиты по типу файла
+(UPLOAD_MAX_VIDEO_SIZE / UPLOAD_MAX_IMAGE_SIZE по имени поля формы) проверяются там же, пока тело
+принимается: части формы считаются тем же потоковым парсером multipart, что и у Starlette, и запрос
+прерывается на первом лишнем байте файла, а не после записи всей формы во временные файлы.
+validate_upload_sizes повторяет проверку в роутерах до создания заявки (в том числе для возобновляемой загрузки).
+stream_upload копирует файл из временного хранилища Starlette в место назначения небольшими блоками,
+считая SHA-256 по ходу записи.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import List
+
+import aiofiles
+from fastapi import UploadFile
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.media.exceptions import ImageTooLarge, UploadTooLarge, VideoTooLarge
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _is_multipart(scope):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.UPLOAD_MAX_REQUEST_SIZE
+        content_length = _content_length(scope)
+        received = 0
+        parts = _PartSizeLimiter.from_scope(scope)
+
+        async def limited_receive() -> Message:
+            # Исключение из receive выходит из разбора формы и превращается в ответ 413 обработчиком FastAPI
+            nonlocal received
+            if content_length is not None and content_length > limit:
+                raise UploadTooLarge()
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if received > limit:
+                    raise UploadTooLarge()
+                if parts is not None:
+                    parts.write(body)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _part_limit(field_name: str) -> tuple[int, type[UploadTooLarge]] | None:
+    """Лимит файла по имени поля формы (video_file / image_files в src/services/router.py)"""
+    if field_name == "video_file":
+        return settings.UPLOAD_MAX_VIDEO_SIZE, VideoTooLarge
+    if field_name == "image_files":
+        return settings.UPLOAD_MAX_IMAGE_SIZE, ImageTooLarge
+    return None
+
+
+class _PartSizeLimiter:
+    """Разбор multipart по мере получения тела: размер каждого файла формы сверяется с лимитом его поля"""
+
+    def __init__(self, boundary: bytes) -> None:
+        self._parser: MultipartParser | None = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+        })
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._limit: tuple[int, type[UploadTooLarge]] | None = None
+        self._size = 0
+
+    @classmethod
+    def from_scope(cls, scope: Scope) -> "_PartSizeLimiter | None":
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                _, options = parse_options_header(value)
+                boundary = options.get(b"boundary")
+                return cls(boundary) if boundary else None
+        return None
+
+    def write(self, data: bytes) -> None:
+        if self._parser is None:
+            return
+        try:
+            self._parser.write(data)
+        except UploadTooLarge:
+            raise
+        except Exception:
+            # Некорректное тело отклонит разбор формы в Starlette; здесь остаётся только общий лимит
+            self._parser = None
+
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+        self._limit = None
+        self._size = 0
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        # Лимит по типу - только для файлов; обычные поля ограничены общим размером запроса
+        if b"filename" in options:
+            self._limit = _part_limit(options.get(b"name", b"").decode("latin-1"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._limit is None:
+            return
+        self._size += end - start
+        max_size, error = self._limit
+        if self._size > max_size:
+            raise error()
+
+
+def _is_multipart(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            return value.lower().startswith(b"multipart/")
+    return False
+
+
+def _content_length(scope: Scope) -> int | None:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def validate_upload_sizes(video_file: UploadFile | None, image_files: List[UploadFile] | None) -> None:
+    """
+    Лимиты по типу файла; вызывается до создания записей в базе. Файлы формы уже проверены
+    UploadLimitMiddleware при приёме, возобновляемая загрузка (ResumableUpload) - только здесь.
+    """
+    if video_file and (video_file.size or 0) > settings.UPLOAD_MAX_VIDEO_SIZE:
+        raise VideoTooLarge()
+    for image in image_files or []:
+        if (image.size or 0) > settings.UPLOAD_MAX_IMAGE_SIZE:
+            raise ImageTooLarge()
+
+
+async def stream_upload(upload: UploadFile, file_path: str, max_size: int) -> tuple[int, str]:
+    """
+    Записать загруженный файл в file_path блоками по UPLOAD_CHUNK_SIZE; файл появляется целиком
+    (через временный .part). Возвращает размер и SHA-256 содержимого.
+    """
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    await upload.seek(0)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                await f.write(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 файла, принятого частями (возобновляемая загрузка); вызывается в потоке"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,313 @@
+"""
+Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+Каждый воркер gunicorn считает метрики у себя и раз в METRICS_FLUSH_INTERVAL секунд (и при каждом /metrics)
+сохраняет снимок в METRICS_DIR/<pid>.json (по умолчанию в /dev/shm, как и worker_tmp_dir). /metrics
+складывает снимки всех воркеров: счётчики и гистограммы суммируются (включая завершившиеся воркеры),
+gauge - только по живым воркерам. Каталог очищается при старте gunicorn (on_starting в gunicorn_conf.py).
+Без каталога (dev-режим) отдаются метрики одного процесса.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from typing import Callable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.database import engine, get_pool_stats, replicas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelsKey = str  # JSON-список пар (имя, значение) - ключ серии в снимке
+
+
+def _labels_key(labels: dict[str, str]) -> LabelsKey:
+    return json.dumps(sorted(labels.items()))
+
+
+def _format_labels(key: LabelsKey, extra: dict[str, str] | None = None) -> str:
+    pairs = [*json.loads(key), *(extra or {}).items()]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[LabelsKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        return dict(self._values)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[LabelsKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[_labels_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> dict:
+        return dict(self._values)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        self._values: dict[LabelsKey, dict] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels_key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        series["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def time(self, **labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def snapshot(self) -> dict:
+        return {key: {**series, "buckets": list(series["buckets"])} for key, series in self._values.items()}
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict[str, str]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self, directory: str | None) -> None:
+        self.directory = directory
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets))
+
+    def collector(self, func: Callable[[], None]) -> Callable[[], None]:
+        """Функция, обновляющая gauge/счётчики перед снимком (например, состояние пула соединений)"""
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self) -> dict[str, dict]:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self) -> None:
+        """Сохранить снимок метрик воркера для остальных воркеров"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning("Metrics snapshot is not saved: %s", e)
+
+    def _worker_snapshots(self) -> list[tuple[bool, dict]]:
+        self.flush()
+        if not self.directory or not os.path.isdir(self.directory):
+            return [(True, self.snapshot())]
+
+        snapshots = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name)) as f:
+                    snapshots.append((_is_alive(int(file_name[:-5])), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """Метрики всех воркеров в текстовом формате Prometheus"""
+        snapshots = self._worker_snapshots()
+        lines = []
+
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+
+            if isinstance(metric, Histogram):
+                merged: dict[LabelsKey, dict] = {}
+                for _, snapshot in snapshots:
+                    for key, series in snapshot.get(name, {}).items():
+                        total = merged.setdefault(key, {"buckets": [0] * (len(metric.buckets) + 1), "sum": 0.0,
+                                                        "count": 0})
+                        total["buckets"] = [a + b for a, b in zip(total["buckets"], series["buckets"])]
+                        total["sum"] += series["sum"]
+                        total["count"] += series["count"]
+
+                for key, series in merged.items():
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, float("inf")), series["buckets"]):
+                        cumulative += count
+                        le = {"le": _format_number(bound)}
+                        lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_number(series['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {series['count']}")
+                continue
+
+            merged_values: dict[LabelsKey, float] = {}
+            for alive, snapshot in snapshots:
+                if isinstance(metric, Gauge) and not alive:
+                    continue
+                for key, value in snapshot.get(name, {}).items():
+                    merged_values[key] = merged_values.get(key, 0) + value
+
+            for key, value in merged_values.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    async def run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry(settings.METRICS_DIR)
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route"
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being processed"
+)
+db_pool_checked_out = registry.gauge(
+    "db_pool_checked_out", "Database connections checked out from the pool"
+)
+db_pool_overflow = registry.gauge(
+    "db_pool_overflow", "Database connections opened above pool_size"
+)
+cache_requests = registry.counter(
+    "response_cache_requests_total", "Response cache lookups by result (hit/miss)"
+)
+image_processing_duration = registry.histogram(
+    "image_processing_duration_seconds", "Time to decode, transform and save one uploaded image"
+)
+video_bytes_sent = registry.counter(
+    "media_video_bytes_sent_total", "Bytes streamed by /media/video"
+)
+
+
+@registry.collector
+def collect_pool_stats() -> None:
+    for pool_name, db_engine in [("primary", engine), *((replica.url.host, replica) for replica in replicas.engines)]:
+        stats = get_pool_stats(db_engine)
+        if "checked_out" in stats:  # у NullPool нет состояния
+            db_pool_checked_out.set(stats["checked_out"], pool=pool_name)
+            db_pool_overflow.set(max(stats["overflow"], 0), pool=pool_name)
+
+
+class MetricsMiddleware:
+    """Латентность и кол-во выполняющихся HTTP-запросов по шаблону маршрута"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+        http_requests_in_flight.inc()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),  # без шаблона - одна серия, а не по пути
+                status=str(status_code),
+            )
@@ -10,18 +10,23 @@ from sqlalchemy import (
     Column,
     CursorResult,
     DateTime,
+    FetchedValue,
     ForeignKey,
+    Index,
     Insert,
     Integer,
     Select,
     String,
     Update,
-    func
+    and_,
+    func,
+    select,
+    text
 )
 from sqlalchemy import Enum as EnumSQL
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
+from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
+from sqlalchemy.orm import deferred, relationship
 
 from src.database import Base, engine
 
@@ -43,6 +48,9 @@ class CustomModel(BaseModel):
         return jsonable_encoder(self)
 
 
+SEARCH_CONFIG = "russian"  # конфигурация полнотекстового поиска PostgreSQL
+
+
 class ServiceStatus(Enum):
     NEW = "Новая"
     WORKING = "В работе"
@@ -71,8 +79,23 @@ class Roles(Enum):
 class Service(Base):
     """Модель заявок"""
     __tablename__ = "services"
-    __table_args__ = {"schema": "public"}
-    id = Column("id", UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
+    __table_args__ = (
+        # Списки заявок компании по статусу с сортировкой по дате (курсор (updated_at, id)) для каждой роли
+        Index("ix_public_services_company_id_status_updated_at", "company_id", "status", "updated_at", "id"),
+        Index("ix_public_services_executor_id_company_id_status_updated_at",
+              "executor_id", "company_id", "status", "updated_at", "id"),
+        Index("ix_public_services_customer_id_company_id_status_updated_at",
+              "customer_id", "company_id", "status", "updated_at", "id"),
+        # Счётчики непросмотренных заявок
+        Index("ix_public_services_company_id_status_unviewed_admin", "company_id", "status",
+              postgresql_where=text("viewed_admin = false")),
+        Index("ix_public_services_executor_id_company_id_status_unviewed_executor",
+              "executor_id", "company_id", "status", postgresql_where=text("viewed_executor = false")),
+        # Полнотекстовый поиск заявок
+        Index("ix_public_services_search_vector", "search_vector", postgresql_using="gin"),
+        {"schema": "public"},
+    )
+    id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     customer_id = Column("customer_id", Integer, ForeignKey("public.users.id"), nullable=False, index=True)
     executor_id = Column("executor_id", Integer, ForeignKey("public.users.id"), index=True)
     company_id = Column("company_id", UUID(as_uuid=True), ForeignKey("public.company.id"), index=True)
@@ -87,10 +110,14 @@ class Service(Base):
     viewed_executor = Column("viewed_executor", Boolean, server_default="false", nullable=False)
 
     created_at = Column("created_at", DateTime, server_default=func.now(), nullable=False)
-    updated_at = Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
     deadline_at = Column("deadline_at", DateTime, server_default=None, nullable=True)
     comment = Column("comment", String)
     status = Column("status", EnumSQL(ServiceStatus), nullable=False, default=ServiceStatus.NEW)
+    # Поисковый вектор по заголовку, описанию и комментарию (вес - в этом порядке), конфигурация SEARCH_CONFIG;
+    # заполняет триггер services_search_vector, с заявкой не загружается
+    search_vector = deferred(Column("search_vector", TSVECTOR, server_default=FetchedValue(),
+                                    server_onupdate=FetchedValue()))
     media_files = relationship("MediaFiles", back_populates="service", cascade="all, delete-orphan")
 
     customer = relationship("User", foreign_keys=[customer_id], back_populates="customer_services", single_parent=True,
@@ -103,8 +130,16 @@ class Service(Base):
 class User(Base):
     """Модель пользователей"""
     __tablename__ = "users"
-    __table_args__ = {"schema": "public"}
-    id = Column("id", Integer, primary_key=True, index=True, autoincrement=True, unique=True, nullable=False)
+    __table_args__ = (
+        # Списки заказчиков и исполнителей (курсор (created_at, id))
+        Index("ix_public_users_created_at_id", "created_at", "id"),
+        # Поиск исполнителей (pg_trgm)
+        Index("ix_public_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_public_users_phone_digits_trgm", "phone_digits", postgresql_using="gin",
+              postgresql_ops={"phone_digits": "gin_trgm_ops"}),
+        {"schema": "public"},
+    )
+    id = Column("id", Integer, primary_key=True, autoincrement=True, nullable=False)
     username = Column("username", String, unique=True, index=True)
     password = Column("password", String)
     is_active = Column("is_active", Boolean, server_default="false", nullable=False)
@@ -114,6 +149,8 @@ class User(Base):
     role = Column("role", EnumSQL(Roles))
     name = Column("name", String, nullable=True)
     phone = Column("phone", String, nullable=True)
+    # Только цифры телефона, для поиска по части номера в любом формате; заполняет триггер users_phone_digits
+    phone_digits = Column("phone_digits", String, server_default=FetchedValue(), server_onupdate=FetchedValue())
     created_at = Column("created_at", DateTime, server_default=func.now(), nullable=False)
     updated_at = Column("updated_at", DateTime, onupdate=func.now())
     customer_company = relationship("Company", back_populates="customer", cascade="all, delete-orphan", uselist=False)
@@ -139,19 +176,29 @@ class MediaFiles(Base):
     """Модель заявок"""
     __tablename__ = "media_files"
     __table_args__ = {"schema": "public"}
-    id = Column("id", UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
+    id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     service_id = Column("service_id", UUID(as_uuid=True), ForeignKey("public.services.id"), nullable=False, index=True)
     file_type = Column("file_type", EnumSQL(FileTypes), nullable=False)
     owner_type = Column("owner_type", EnumSQL(OwnerTypes), nullable=False)
     url = Column("url", String, nullable=False)
+    # Копии изображения ("thumb.webp", "medium.avif", ...): созданные при загрузке и при первом запросе
+    # в другом размере или формате, см. src/media/processing.py
+    renditions = Column("renditions", JSONB, server_default=text("'[]'::jsonb"), nullable=False)
+    sha256 = Column("sha256", String(64), nullable=True)  # хэш загруженного файла (до обработки)
     service = relationship("Service", back_populates="media_files")
 
 
 class Company(Base):
     """Модель заявок"""
     __tablename__ = "company"
-    __table_args__ = {"schema": "public"}
-    id = Column("id", UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
+    __table_args__ = (
+        # Поиск заказчиков (pg_trgm)
+        Index("ix_public_company_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_public_company_address_trgm", "address", postgresql_using="gin",
+              postgresql_ops={"address": "gin_trgm_ops"}),
+        {"schema": "public"},
+    )
+    id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column("user_id", Integer, ForeignKey("public.users.id"), nullable=False, index=True)
     name = Column("name", String, nullable=False)
     address = Column("address", String, nullable=True)
@@ -167,22 +214,72 @@ class Company(Base):
     def new_services_count(self):
         return sum(1 for service in self.services if (service.status == ServiceStatus.NEW and service.viewed_admin == False))
 
+    @new_services_count.expression
+    def new_services_count(cls):
+        # В запросе считается подзапросом, без загрузки заявок компании
+        return (
+            select(func.count(Service.id))
+            .where(and_(Service.company_id == cls.id, Service.status == ServiceStatus.NEW,
+                        Service.viewed_admin == False))
+            .correlate_except(Service)
+            .scalar_subquery()
+        )
+
+    @hybrid_method
     def new_services_count_executor(self, executor_id):
         return sum(1 for service in self.services if (
                     service.status == ServiceStatus.WORKING and service.viewed_executor == False and service.executor_id == executor_id))
 
+    @new_services_count_executor.expression
+    def new_services_count_executor(cls, executor_id):
+        return (
+            select(func.count(Service.id))
+            .where(and_(Service.company_id == cls.id, Service.status == ServiceStatus.WORKING,
+                        Service.viewed_executor == False, Service.executor_id == executor_id))
+            .correlate_except(Service)
+            .scalar_subquery()
+        )
+
 
 class CompanyContacts(Base):
     """Модель заявок"""
     __tablename__ = "company_contacts"
     __table_args__ = {"schema": "public"}
-    id = Column("id", UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
+    id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     company_id = Column("company_id", UUID(as_uuid=True), ForeignKey("public.company.id"), nullable=False, index=True)
     phone = Column("phone", String, nullable=False)
     person = Column("person", String, nullable=True)
     company = relationship("Company", back_populates="contacts")
 
 
+class CompanyServiceStats(Base):
+    """Счётчики заявок компании: executor_id = 0 - все заявки компании, иначе - заявки исполнителя в компании"""
+    __tablename__ = "company_service_stats"
+    __table_args__ = (
+        Index("ix_public_company_service_stats_executor_id_last_activity_at",
+              "executor_id", "last_activity_at", "company_id"),
+        {"schema": "public"},
+    )
+    company_id = Column("company_id", UUID(as_uuid=True), ForeignKey("public.company.id", ondelete="CASCADE"),
+                        primary_key=True)
+    executor_id = Column("executor_id", Integer, primary_key=True, server_default="0")
+    services_count = Column("services_count", Integer, server_default="0", nullable=False)
+    new_count = Column("new_count", Integer, server_default="0", nullable=False)
+    working_count = Column("working_count", Integer, server_default="0", nullable=False)
+    verifying_count = Column("verifying_count", Integer, server_default="0", nullable=False)
+    closed_count = Column("closed_count", Integer, server_default="0", nullable=False)
+    unviewed_admin = Column("unviewed_admin", Integer, server_default="0", nullable=False)
+    new_unviewed_admin = Column("new_unviewed_admin", Integer, server_default="0", nullable=False)
+    working_unviewed_admin = Column("working_unviewed_admin", Integer, server_default="0", nullable=False)
+    verifying_unviewed_admin = Column("verifying_unviewed_admin", Integer, server_default="0", nullable=False)
+    closed_unviewed_admin = Column("closed_unviewed_admin", Integer, server_default="0", nullable=False)
+    unviewed_executor = Column("unviewed_executor", Integer, server_default="0", nullable=False)
+    working_unviewed_executor = Column("working_unviewed_executor", Integer, server_default="0", nullable=False)
+    verifying_unviewed_executor = Column("verifying_unviewed_executor", Integer, server_default="0", nullable=False)
+    closed_unviewed_executor = Column("closed_unviewed_executor", Integer, server_default="0", nullable=False)
+    last_activity_at = Column("last_activity_at", DateTime, server_default=func.now(), nullable=False)
+
+
 async def fetch_one(select_query: Select | Insert | Update) -> dict[str, Any] | None:
     async with engine.begin() as conn:
         cursor: CursorResult = await conn.execute(select_query)
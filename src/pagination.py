@@ -0,0 +1,160 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement, Select, asc, desc, func, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Непрозрачный курсор из значений колонок сортировки последней записи страницы"""
+    data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values], default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: Sequence[ColumnElement]) -> list[Any]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        raw_values = json.loads(data)
+        if not isinstance(raw_values, list) or len(raw_values) != len(order_by):
+            raise ValueError("cursor length mismatch")
+        return [_coerce_cursor_value(value, column) for value, column in zip(raw_values, order_by)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+
+def _coerce_cursor_value(value: Any, column: ColumnElement) -> Any:
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return python_type(value)
+
+
+def _count_columns(counter_filter: ColumnElement[bool] | None) -> list[ColumnElement]:
+    columns = [func.count()]
+    if counter_filter is not None:
+        columns.append(func.count().filter(counter_filter))
+    return columns
+
+
+def _count_queries(query: Select, counter_filter: ColumnElement[bool] | None, aggregated: bool) -> list[Select]:
+    """
+    Отдельные запросы счётчиков; для запроса с GROUP BY считается кол-во групп.
+    counter_filter накладывается через WHERE, чтобы можно было использовать частичные индексы.
+    """
+    if aggregated:
+        groups = query.with_only_columns(literal(1)).order_by(None).subquery()
+        return [select(func.count()).select_from(groups)]
+
+    count_queries = [query.with_only_columns(func.count()).order_by(None)]
+    if counter_filter is not None:
+        count_queries.append(query.where(counter_filter).with_only_columns(func.count()).order_by(None))
+    return count_queries
+
+
+def build_page_query(
+        query: Select,
+        order_by: Sequence[ColumnElement],
+        limit: int,
+        offset: int = 0,
+        cursor: str | None = None,
+        descending: bool = True,
+        counter_filter: ColumnElement[bool] | None = None,
+        aggregated: bool = False
+) -> Select:
+    """Запрос страницы: выбранные колонки, затем колонки сортировки, затем счётчики (см. fetch_page)"""
+    direction = desc if descending else asc
+
+    page_query = (
+        query
+        .add_columns(*(column.label(f"_order_{index}") for index, column in enumerate(order_by)))
+        .order_by(*(direction(column) for column in order_by))
+        .limit(limit + 1)  # лишняя запись - признак наличия следующей страницы
+    )
+
+    if cursor:
+        values = decode_cursor(cursor, order_by)
+        keyset = tuple_(*order_by)
+        keyset_values = tuple_(*(literal(value, column.type) for value, column in zip(values, order_by)))
+        keyset_condition = keyset < keyset_values if descending else keyset > keyset_values
+        page_query = page_query.having(keyset_condition) if aggregated else page_query.where(keyset_condition)
+
+        # Счётчики считаются по всему списку, а не от курсора - некоррелированными подзапросами
+        return page_query.add_columns(
+            *(count_query.correlate(None).scalar_subquery().label(f"_count_{index}")
+              for index, count_query in enumerate(_count_queries(query, counter_filter, aggregated)))
+        )
+
+    return page_query.add_columns(
+        *(column.over().label(f"_count_{index}") for index, column in enumerate(_count_columns(counter_filter)))
+    ).offset(offset)
+
+
+async def fetch_page(
+        query: Select,
+        order_by: Sequence[ColumnElement],
+        limit: int,
+        session: AsyncSession,
+        offset: int = 0,
+        cursor: str | None = None,
+        descending: bool = True,
+        counter_filter: ColumnElement[bool] | None = None,
+        aggregated: bool = False
+) -> tuple[list[Any], int, int, str | None]:
+    """
+    Страница списка, общее кол-во записей и кол-во записей по counter_filter (например, непросмотренных)
+    одним запросом.
+
+    Параметры:
+    - query: запрос без сортировки и пагинации
+    - order_by: колонки сортировки NOT NULL (курсор сравнивается как значение строки, NULL обрывает список),
+      последняя должна быть уникальной (например, (updated_at, id))
+    - offset: смещение для постраничного режима
+    - cursor: курсор из next_cursor предыдущей страницы; если передан, offset не используется
+    - aggregated: запрос с GROUP BY, условие курсора накладывается через HAVING, total - кол-во групп
+      (counter_filter для такого запроса не поддерживается)
+
+    Возвращает:
+    - items: объекты (если в запросе одна сущность) или строки (служебные колонки добавлены в конец)
+    - total: общее кол-во записей, подходящих под запрос
+    - counter: кол-во записей, подходящих под counter_filter (0, если фильтр не передан)
+    - next_cursor: курсор следующей страницы или None, если страница последняя
+    """
+    width = len(query.column_descriptions)
+    page_query = build_page_query(query, order_by, limit, offset, cursor, descending, counter_filter, aggregated)
+
+    result = await session.execute(page_query)
+    rows = result.all()
+
+    counts_index = width + len(order_by)
+    if rows:
+        total = rows[0][counts_index]
+        counter = rows[0][counts_index + 1] if counter_filter is not None else 0
+    elif offset > 0 or cursor:
+        # Страница за пределами списка - счётчики из основного запроса недоступны, считаем отдельно
+        counts = [(await session.execute(count_query)).scalar()
+                  for count_query in _count_queries(query, counter_filter, aggregated)]
+        total = counts[0]
+        counter = counts[1] if counter_filter is not None else 0
+    else:
+        total = counter = 0
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][width:counts_index])
+
+    items = [row[0] for row in rows] if width == 1 else rows
+    return items, total, counter, next_cursor
+
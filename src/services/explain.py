@@ -0,0 +1,129 @@
+"""
+Проверка планов запросов списков: EXPLAIN каждого запроса должен использовать свой индекс.
+
+Запуск: python -m src.services.explain (scripts/explain-indexes)
+
+Seq scan на время проверки выключается (SET LOCAL enable_seqscan = off): на небольшой базе планировщик
+всегда выбирает последовательное чтение, а проверяется именно то, что индекс подходит под форму запроса.
+"""
+import asyncio
+import json
+import sys
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Select, or_, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from src.database import engine
+from src.models import Company, Roles, Service, ServiceStatus, User
+from src.pagination import build_page_query, encode_cursor
+from src.services.filters import services_list_query
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: Select) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kwargs) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
+
+
+def _used_indexes(plan: dict) -> set[str]:
+    indexes = set()
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return indexes
+
+
+def _list_checks(company_id: uuid.UUID, executor_id: int, customer_id: int) -> list[tuple[str, Select, set[str]]]:
+    order_by = (Service.updated_at, Service.id)
+    cursor = encode_cursor([datetime.utcnow(), uuid.uuid4()])
+    checks = []
+
+    for role, user_id, page_index, unviewed_index in [
+        (Roles.ADMIN, None,
+         "ix_public_services_company_id_status_updated_at",
+         "ix_public_services_company_id_status_unviewed_admin"),
+        (Roles.EXECUTOR, executor_id,
+         "ix_public_services_executor_id_company_id_status_updated_at",
+         "ix_public_services_executor_id_company_id_status_unviewed_executor"),
+        (Roles.CUSTOMER, customer_id,
+         "ix_public_services_customer_id_company_id_status_updated_at",
+         None),
+    ]:
+        query, unviewed_filter = services_list_query(role, ServiceStatus.WORKING, company_id, False, False, user_id)
+        checks.append((
+            f"services list ({role.value}, page)",
+            build_page_query(query, order_by, 15, offset=15, counter_filter=unviewed_filter),
+            {page_index},
+        ))
+        checks.append((
+            f"services list ({role.value}, cursor)",
+            build_page_query(query, order_by, 15, cursor=cursor, counter_filter=unviewed_filter),
+            {page_index, unviewed_index} - {None},
+        ))
+
+    executors_query = select(User.id, User.name, User.phone, User.username).where(User.is_executor, User.is_active)
+    checks.append((
+        "executors list (page)",
+        build_page_query(executors_query, (User.created_at, User.id), 25),
+        {"ix_public_users_created_at_id"},
+    ))
+    checks.append((
+        "executors search",
+        build_page_query(executors_query.where(or_(User.name.ilike("%search%"), User.phone_digits.like("%123%"))),
+                         (User.created_at, User.id), 25),
+        {"ix_public_users_name_trgm", "ix_public_users_phone_digits_trgm"},
+    ))
+    checks.append((
+        "customers search",
+        build_page_query(
+            select(User.id, Company.id).join(Company)
+            .where(User.is_customer, or_(Company.name.ilike("%search%"), Company.address.ilike("%search%"))),
+            (User.created_at, User.id), 25
+        ),
+        {"ix_public_company_name_trgm", "ix_public_company_address_trgm"},
+    ))
+
+    return checks
+
+
+async def verify_list_indexes() -> bool:
+    async with engine.begin() as conn:
+        await conn.execute(text("SET LOCAL enable_seqscan = off"))
+
+        sample = (await conn.execute(
+            select(Service.company_id, Service.executor_id, Service.customer_id)
+            .order_by(Service.executor_id.is_(None))
+            .limit(1)
+        )).first()
+        company_id, executor_id, customer_id = sample if sample else (uuid.uuid4(), 0, 0)
+
+        success = True
+        for name, statement, expected in _list_checks(company_id, executor_id or 0, customer_id):
+            plan = (await conn.execute(Explain(statement))).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = _used_indexes(plan[0]["Plan"])
+            missing = expected - used
+            success = success and not missing
+            status = "FAIL" if missing else "OK"
+            print(f"{status:4} {name}: uses {sorted(used) or 'no indexes'}"
+                  + (f", expected {sorted(missing)}" if missing else ""))
+
+    await engine.dispose()
+    return success
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(verify_list_indexes()) else 1)
@@ -0,0 +1,122 @@
+"""
+Фильтры списка заявок по флагам запроса emergency / custom_position.
+
+Каждая комбинация флагов сводится к простому условию по колонкам заявки:
+- (False, False) - все заявки, без условия
+- (True, False) - только срочные
+- (False, True) - только заказные позиции
+- (True, True) - срочные или заказные позиции
+
+Запрос списка для (роль, статус, флаги) строится один раз и кэшируется; company_id и id пользователя
+передаются через bindparam, поэтому SQLAlchemy переиспользует и скомпилированный SQL.
+
+Сверка с прежним условием для всех сочетаний флагов и колонок: tests/test_service_filters.py,
+на данных базы: python -m src.services.filters (scripts/verify-service-filters)
+"""
+import asyncio
+import sys
+from functools import lru_cache
+
+from sqlalchemy import ColumnElement, Select, and_, bindparam, except_, func, or_, select, union_all
+
+from src.database import engine
+from src.models import Roles, Service, ServiceStatus
+
+FLAG_FILTERS: dict[tuple[bool, bool], ColumnElement[bool] | None] = {
+    (False, False): None,
+    (True, False): Service.emergency == True,
+    (False, True): Service.custom_position == True,
+    (True, True): or_(Service.emergency == True, Service.custom_position == True),
+}
+
+
+def flags_filter(emergency: bool, custom_position: bool) -> ColumnElement[bool] | None:
+    """Условие по флагам запроса; None - фильтровать не нужно"""
+    return FLAG_FILTERS[(bool(emergency), bool(custom_position))]
+
+
+@lru_cache(maxsize=None)
+def _services_list_template(role: Roles, service_status: ServiceStatus, emergency: bool,
+                            custom_position: bool) -> tuple[Select, ColumnElement[bool]]:
+    query = (
+        select(Service)
+        .where(
+            Service.company_id == bindparam("company_id"),
+            Service.status == service_status
+        )
+    )
+
+    condition = flags_filter(emergency, custom_position)
+    if condition is not None:
+        query = query.where(condition)
+
+    if role == Roles.CUSTOMER:
+        query = query.where(Service.customer_id == bindparam("user_id"))
+        unviewed_filter = Service.viewed_customer == False
+    elif role == Roles.EXECUTOR:
+        query = query.where(Service.executor_id == bindparam("user_id"))
+        unviewed_filter = Service.viewed_executor == False
+    else:
+        unviewed_filter = Service.viewed_admin == False
+
+    return query, unviewed_filter
+
+
+def services_list_query(role: Roles, service_status: ServiceStatus, company_id, emergency: bool,
+                        custom_position: bool, user_id: int = None) -> tuple[Select, ColumnElement[bool]]:
+    """Запрос списка заявок компании по статусу и фильтр непросмотренных заявок для роли"""
+    query, unviewed_filter = _services_list_template(role, service_status, bool(emergency), bool(custom_position))
+
+    params = {"company_id": company_id}
+    if role in (Roles.CUSTOMER, Roles.EXECUTOR):
+        params["user_id"] = user_id
+
+    return query.params(params), unviewed_filter
+
+
+def _legacy_flags_filter(emergency: bool, custom_position: bool) -> ColumnElement[bool]:
+    """Прежнее условие списков заявок, используется только для сверки"""
+    return or_(
+        and_(Service.emergency == True, emergency == True, custom_position == False),
+        and_(Service.custom_position == True, emergency == False, custom_position == True),
+        and_(
+            or_(Service.emergency == True, Service.custom_position == True),
+            emergency == True,
+            custom_position == True
+        ),
+        and_(Service.custom_position == False, Service.emergency == False, emergency == False,
+             custom_position == False),
+        and_(Service.custom_position == True, Service.emergency == False, emergency == False,
+             custom_position == False),
+        and_(Service.custom_position == False, Service.emergency == True, emergency == False,
+             custom_position == False),
+        and_(Service.custom_position == True, Service.emergency == True, emergency == False,
+             custom_position == False)
+    )
+
+
+async def verify_flag_filters() -> bool:
+    """Для каждой комбинации флагов оба условия должны выбирать одни и те же заявки"""
+    success = True
+    async with engine.connect() as conn:
+        for emergency, custom_position in FLAG_FILTERS:
+            new_condition = flags_filter(emergency, custom_position)
+            legacy_condition = _legacy_flags_filter(emergency, custom_position)
+            new_ids = select(Service.id)
+            if new_condition is not None:
+                new_ids = new_ids.where(new_condition)
+            legacy_ids = select(Service.id).where(legacy_condition)
+
+            # Заявки, которые выбирает только одно из условий
+            mismatched = union_all(except_(new_ids, legacy_ids), except_(legacy_ids, new_ids)).subquery()
+            difference = await conn.scalar(select(func.count()).select_from(mismatched))
+            success = success and difference == 0
+            status = "FAIL" if difference else "OK"
+            print(f"{status:4} emergency={emergency} custom_position={custom_position}: {difference} mismatched")
+
+    await engine.dispose()
+    return success
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(verify_flag_filters()) else 1)
@@ -8,12 +8,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.auth.exceptions import AuthorizationFailed
 from src.auth.jwt import validate_admin_access, validate_customer_access, parse_jwt_user_data, \
     validate_admin_and_customer_access
-from src.database import get_async_session
+from src.database import get_async_session, get_routing_async_session
 from src.models import User, OwnerTypes, ServiceStatus
 from src.services.schemas import ServiceResponse, ServiceCreateInput, ServiceCreateByAdminInput, ServiceAssignInput, \
-    CompaniesListPaginated, ServicesListPaginated, CustomerServicesListPaginated, ServiceUpdateInput
+    CompaniesListPaginated, ServicesListPaginated, CustomerServicesListPaginated, ServiceUpdateInput, \
+    ServicesSearchPaginated
 from src.services import service as services
-from src.media import service as media_service
+from src.media import resumable, service as media_service
+from src.media.uploads import validate_upload_sizes
 
 router = APIRouter()
 
@@ -63,6 +65,8 @@ async def create_new_service_by_admin(
     if not video_file and count_images > 3:
         raise HTTPException(status_code=400, detail="If there is no video, there can be at most 3 images")
 
+    validate_upload_sizes(video_file, image_files)
+
     service_data = ServiceCreateByAdminInput(
         customer_id=customer_id,
         executor_id=executor_id,
@@ -93,6 +97,7 @@ async def create_new_service(
         emergency: bool = Form(...),
         deadline_at: datetime = Form(None),
         video_file: UploadFile = File(None),
+        video_upload_id: uuid.UUID = Form(None, description="Завершённая возобновляемая загрузка видео"),
         image_files: List[UploadFile] = File(None),
         session: AsyncSession = Depends(get_async_session),
         current_user: User = Depends(parse_jwt_user_data)
@@ -100,6 +105,8 @@ async def create_new_service(
     # if not video_file and not image_files:
     #     raise HTTPException(status_code=400, detail="You must upload at least one file")
 
+    video_file = video_file or resumable.get_completed_upload(video_upload_id, int(current_user.user_id))
+
     count_images = len(image_files) if image_files else 0
     count_videos = 1 if video_file else 0
 
@@ -116,6 +123,8 @@ async def create_new_service(
     if not video_file and count_images > 3:
         raise HTTPException(status_code=400, detail="If there is no video, there can be at most 3 images")
 
+    validate_upload_sizes(video_file, image_files)
+
     service_data = ServiceCreateInput(
         title=title,
         description=description,
@@ -152,6 +161,7 @@ async def assign_executor(
 async def mark_service_verifying_by_executor(
         service_id: uuid.UUID = Form(...),
         video_file: UploadFile = File(None),
+        video_upload_id: uuid.UUID = Form(None, description="Завершённая возобновляемая загрузка видео"),
         image_files: List[UploadFile] = File(None),
         current_user: User = Depends(parse_jwt_user_data),
         session: AsyncSession = Depends(get_async_session)
@@ -159,6 +169,8 @@ async def mark_service_verifying_by_executor(
     if not any([current_user.is_admin, current_user.is_executor]):
         raise AuthorizationFailed()
 
+    video_file = video_file or resumable.get_completed_upload(video_upload_id, int(current_user.user_id))
+
     service_executor_id, service_status = await services.get_service_executor_id(service_id, session)
 
     if not service_executor_id:
@@ -191,6 +203,8 @@ async def mark_service_verifying_by_executor(
     if not video_file and count_images > 2:
         raise HTTPException(status_code=400, detail="If there is no video, there can be at most 2 images")
 
+    validate_upload_sizes(video_file, image_files)
+
     owner_type = OwnerTypes.EXECUTOR
 
     if video_file:
@@ -225,19 +239,22 @@ async def close_service(
 @router.get("/companies/all", status_code=status.HTTP_200_OK, response_model=CompaniesListPaginated)
 async def get_all_companies(
         page: int = 1,
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor), заменяет page"),
         limit: int = Query(default=15, lte=50),
         current_user: User = Depends(parse_jwt_user_data),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_routing_async_session)
 ) -> dict[str, Any]:
     if not any([current_user.is_admin, current_user.is_executor]):
         raise AuthorizationFailed()
 
     executor_id = int(current_user.user_id) if current_user.is_executor else None
 
-    companies_list, total = await services.get_all_companies_with_services_info(page, limit, session, executor_id)
+    companies_list, total, next_cursor = await services.get_all_companies_with_services_info(page, limit, session,
+                                                                                           executor_id, cursor)
 
     response = {
         "total": total,
+        "next_cursor": next_cursor,
         "items": companies_list
     }
 
@@ -252,9 +269,10 @@ async def get_all_company_services_by_status(
         emergency: bool = False,
         custom_position: bool = False,
         page: int = 1,
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor), заменяет page"),
         limit: int = Query(default=15, lte=50),
         current_user: User = Depends(parse_jwt_user_data),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_routing_async_session)
 ) -> dict[str, Any]:
     """
     Получение списка заявок по статусу с пагинацией для администратора и исполнителя
@@ -263,6 +281,7 @@ async def get_all_company_services_by_status(
     - value: Статус заявки (new|working|verifying|closed).
     - sort: Сортировка.
     - page: Страница.
+    - cursor: Курсор следующей страницы из next_cursor предыдущего ответа (вместо page).
     - limit: Кол-во заявок на одной странице.
     - session (AsyncSession): Сессия SQLAlchemy для взаимодействия с базой данных.
 
@@ -286,13 +305,14 @@ async def get_all_company_services_by_status(
     if service_status is None:
         raise HTTPException(status_code=400, detail="Статус не существует")
 
-    services_list, total, counter = await services.get_services_by_status(service_status, company_id, sort, page, limit,
-                                                                          emergency, custom_position, session,
-                                                                          executor_id)
+    services_list, total, counter, next_cursor = await services.get_services_by_status(
+        service_status, company_id, sort, page, limit, emergency, custom_position, session, executor_id, cursor
+    )
 
     response = {
         "total": total,
         "counter": counter,
+        "next_cursor": next_cursor,
         "items": services_list
     }
 
@@ -306,9 +326,10 @@ async def get_all_customer_services_by_status(
         emergency: bool = False,
         custom_position: bool = False,
         page: int = 1,
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor), заменяет page"),
         limit: int = Query(default=15, lte=50),
         current_user: User = Depends(parse_jwt_user_data),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_routing_async_session)
 ) -> dict[str, Any]:
     """
     Получение списка заявок по статусу с пагинацией для администратора и заказчика
@@ -317,6 +338,7 @@ async def get_all_customer_services_by_status(
     - value: Статус заявки (new|working|verifying|closed).
     - sort: Сортировка.
     - page: Страница.
+    - cursor: Курсор следующей страницы из next_cursor предыдущего ответа (вместо page).
     - limit: Кол-во заявок на одной странице.
     - session (AsyncSession): Сессия SQLAlchemy для взаимодействия с базой данных.
 
@@ -342,14 +364,61 @@ async def get_all_customer_services_by_status(
 
     company_id = await services.get_company_id_by_customer(customer_id, session)
 
-    services_list, total, counter = await services.get_customer_services_by_status(service_status, company_id, sort,
-                                                                                   page, limit, emergency,
-                                                                                   custom_position, session,
-                                                                                   customer_id)
+    services_list, total, counter, next_cursor = await services.get_customer_services_by_status(
+        service_status, company_id, sort, page, limit, emergency, custom_position, session, customer_id, cursor
+    )
 
     response = {
         "total": total,
         "counter": counter,
+        "next_cursor": next_cursor,
+        "items": services_list
+    }
+
+    return response
+
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=ServicesSearchPaginated,
+            dependencies=[Depends(validate_admin_access)])
+async def search_services(
+        q: str = Query(..., min_length=2, description="Поисковый запрос"),
+        value: str = Query(None, description="Статус заявки", regex="^(new|working|verifying|closed)$"),
+        company_id: uuid.UUID = None,
+        executor_id: int = None,
+        date_from: datetime = Query(None, description="Создана не раньше"),
+        date_to: datetime = Query(None, description="Создана раньше"),
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor)"),
+        limit: int = Query(default=15, lte=50),
+        session: AsyncSession = Depends(get_routing_async_session)
+) -> dict[str, Any]:
+    """
+    Полнотекстовый поиск заявок по заголовку, описанию и комментарию для администратора
+
+    Параметры:
+    - q: Поисковый запрос (поддерживаются "фразы в кавычках", OR и -исключение).
+    - value: Статус заявки (new|working|verifying|closed).
+    - company_id, executor_id: Компания и исполнитель заявки.
+    - date_from, date_to: Период создания заявки.
+    - cursor: Курсор следующей страницы из next_cursor предыдущего ответа.
+    - limit: Кол-во заявок на одной странице.
+
+    Возвращает:
+    - ServicesSearchPaginated: Общее кол-во найденных заявок и страница заявок, самые релевантные - первыми.
+    """
+    status_mapping = {
+        'new': ServiceStatus.NEW,
+        'working': ServiceStatus.WORKING,
+        'verifying': ServiceStatus.VERIFYING,
+        'closed': ServiceStatus.CLOSED,
+    }
+
+    services_list, total, next_cursor = await services.search_services(
+        q, limit, session, status_mapping.get(value), company_id, executor_id, date_from, date_to, cursor
+    )
+
+    response = {
+        "total": total,
+        "next_cursor": next_cursor,
         "items": services_list
     }
 
@@ -391,6 +460,8 @@ async def edit_service_by_customer(
         except:
             raise HTTPException(status_code=400, detail="Ошибка получения прикрепленных файлов")
 
+    validate_upload_sizes(video_file, image_files)
+
     db_video_counter, db_image_counter = await media_service.remove_unused_media_files(service_id, old_files, session)
 
     count_images = len(image_files) if image_files else 0
@@ -3,8 +3,10 @@ from typing import List, Optional
 from uuid import UUID
 
 from fastapi import UploadFile, File
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 
+from src.media.processing import RENDITIONS
+from src.media.signing import sign_image_url, sign_video_url
 from src.models import CustomModel, ServiceStatus, FileTypes, OwnerTypes
 from src.users.schemas import CustomerUserResponse, ExecutorUserResponse
 
@@ -35,6 +37,14 @@ class MediaFilesResponse(BaseModel):
     file_type: FileTypes
     owner_type: OwnerTypes
 
+    @computed_field
+    @property
+    def urls(self) -> dict[str, str]:
+        """Подписанные ссылки: для изображения - по размерам (thumb, medium, full), для видео - video"""
+        if self.file_type == FileTypes.VIDEO:
+            return {"video": sign_video_url(self.id)}
+        return {size: sign_image_url(self.id, size) for size in RENDITIONS}
+
 
 class ServiceResponse(CustomModel):
     id: UUID
@@ -90,6 +100,7 @@ class CompaniesListedResponse(CustomModel):
 
 class CompaniesListPaginated(CustomModel):
     total: int
+    next_cursor: str | None = None
     items: List[CompaniesListedResponse]
 
 
@@ -115,12 +126,20 @@ class ServiceListedResponse(CustomModel):
 class ServicesListPaginated(CustomModel):
     total: int
     counter: int
+    next_cursor: str | None = None
+    items: List[ServiceListedResponse]
+
+
+class ServicesSearchPaginated(CustomModel):
+    total: int
+    next_cursor: str | None = None
     items: List[ServiceListedResponse]
 
 
 class CustomerServicesListPaginated(CustomModel):
     total: int
     counter: int
+    next_cursor: str | None = None
     items: List[ServiceListedResponse]
 
 
@@ -1,16 +1,53 @@
+from datetime import datetime
 from typing import Any, List
 from uuid import UUID
 
 from fastapi import HTTPException, UploadFile
-from sqlalchemy import select, update, func, and_, desc, exists, case, asc, delete, or_
+from sqlalchemy import select, func, and_, case, Float, literal_column
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload, joinedload
-
-from src.models import Service, ServiceStatus, User, Company, OwnerTypes, Roles
+from sqlalchemy.orm import selectinload
+
+from src.cache import COMPANIES_SCOPE, cached, company_scope, invalidate_after_commit, service_scope
+from src.config import settings
+from src.exceptions import DetailedHTTPException
+from src.models import Service, ServiceStatus, User, Company, OwnerTypes, Roles, CompanyServiceStats, SEARCH_CONFIG
+from src.pagination import fetch_page
+from src.services.filters import services_list_query
+from src.services import stats as _stats  # noqa: F401 - счётчики company_service_stats обновляются событиями сессии
 from src.services.schemas import ServiceCreateInput, ServiceCreateByAdminInput, ServiceUpdateInput
 from src.users.service import get_user_profile_by_id, get_user_by_role
 from src.media import service as media_service
+from src.media.paths import media_paths
+
+
+async def company_services_changed(company_id: UUID, session: AsyncSession) -> None:
+    """
+    Сброс списков компании в кэше после commit. Счётчики company_service_stats обновляются
+    приращениями при flush изменённых заявок (src/services/stats.py)
+    """
+    if company_id:
+        invalidate_after_commit(session, company_scope(company_id), COMPANIES_SCOPE)
+
+
+async def _discard_new_service(service_id: UUID, session: AsyncSession) -> None:
+    """
+    Удалить только что созданную заявку, медиафайлы которой сохранить не удалось: заявка фиксируется
+    до сохранения файлов (им нужен её id), и без удаления в списках осталась бы заявка без медиафайлов
+    """
+    await session.rollback()
+    result = await session.execute(
+        select(Service).options(selectinload(Service.media_files)).where(Service.id == service_id)
+    )
+    service = result.scalar_one_or_none()
+    if service is not None:
+        for media_file in service.media_files:
+            await session.delete(media_file)
+        await session.delete(service)
+        await company_services_changed(service.company_id, session)
+        invalidate_after_commit(session, service_scope(service_id))
+        await session.commit()
+    await media_service.remove_service_media_dirs(service_id)
 
 
 async def create_new_service_by_admin(
@@ -20,6 +57,7 @@ async def create_new_service_by_admin(
         image_files: List[UploadFile],
         session: AsyncSession
 ) -> dict[str, Any] | None:
+    service_id = None
     try:
         if customer_id == service_data.executor_id:
             raise ValueError("Вы не можете назначить исполнение заявки заказчику")
@@ -43,8 +81,10 @@ async def create_new_service_by_admin(
         )
 
         session.add(new_service)
+        await company_services_changed(new_service.company_id, session)
         await session.commit()
         await session.refresh(new_service)
+        service_id = new_service.id
 
         new_service.customer = customer
 
@@ -75,6 +115,11 @@ async def create_new_service_by_admin(
         # Обработка ошибок
         print(f"Error creating service by admin: {e}")
         await session.rollback()
+        if service_id is not None:
+            await _discard_new_service(service_id, session)
+        # Ошибки загрузки (413 - слишком большой файл, 503 - очередь обработки изображений) - без изменений
+        if isinstance(e, DetailedHTTPException):
+            raise
         raise HTTPException(status_code=400, detail=str(e))
     finally:
         # закрыть сессию после выполнения операций
@@ -88,6 +133,7 @@ async def create_new_service_by_customer(
         image_files: List[UploadFile],
         session: AsyncSession
 ) -> dict[str, Any] | None:
+    service_id = None
     try:
         customer = await get_user_profile_by_id(customer_id, session)
 
@@ -105,8 +151,10 @@ async def create_new_service_by_customer(
         )
 
         session.add(new_service)
+        await company_services_changed(new_service.company_id, session)
         await session.commit()
         await session.refresh(new_service)
+        service_id = new_service.id
 
         new_service.customer = customer
 
@@ -133,6 +181,11 @@ async def create_new_service_by_customer(
         # Обработка ошибок
         print(f"Error creating service by customer: {e}")
         await session.rollback()
+        if service_id is not None:
+            await _discard_new_service(service_id, session)
+        # Ошибки загрузки (413 - слишком большой файл, 503 - очередь обработки изображений) - без изменений
+        if isinstance(e, DetailedHTTPException):
+            raise
         raise HTTPException(status_code=400, detail=f"Ошибка создания заявки")
     finally:
         # закрыть сессию после выполнения операций
@@ -165,6 +218,7 @@ async def assign_executor_to_service(assign_data, session: AsyncSession):
         if assign_data.custom_position is not None:
             service.custom_position = assign_data.custom_position
 
+        await company_services_changed(service.company_id, session)
         await session.commit()
         await session.refresh(service)
 
@@ -203,18 +257,14 @@ async def get_service_executor_id(service_id: UUID, session: AsyncSession):
 
 async def mark_service_verifying(service_id: UUID, session: AsyncSession):
     try:
-        # Update the Service status to VERIFYING
-        update_query = (
-            update(Service)
-            .where(Service.id == service_id)
-            .values(
-                status=ServiceStatus.VERIFYING,
-                viewed_admin=False,
-                viewed_customer=False,
-                viewed_executor=True,
-            )
-        )
-        await session.execute(update_query)
+        # Update the Service status to VERIFYING (через ORM - прежнее состояние нужно для счётчиков компании)
+        service = await session.get(Service, service_id)
+        if service is not None:
+            service.status = ServiceStatus.VERIFYING
+            service.viewed_admin = False
+            service.viewed_customer = False
+            service.viewed_executor = True
+            await company_services_changed(service.company_id, session)
 
         # Commit the changes to the database
         await session.commit()
@@ -242,19 +292,28 @@ async def get_service_card_by_id(service_id: UUID, role: Roles, session: AsyncSe
     model = await session.execute(select_query)
     service = model.scalar_one_or_none()
 
+    if service is None:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+
+    # Клиент запросит медиафайлы карточки следующими запросами - пути уже известны
+    media_paths.remember(service.media_files)
+
     if role == Roles.ADMIN:
         if not service.viewed_admin:
             service.viewed_admin = True
+            await company_services_changed(service.company_id, session)
             await session.commit()
             await session.refresh(service)
     elif role == Roles.CUSTOMER:
         if not service.viewed_customer:
             service.viewed_customer = True
+            await company_services_changed(service.company_id, session)
             await session.commit()
             await session.refresh(service)
     elif role == Roles.EXECUTOR:
         if not service.viewed_executor:
             service.viewed_executor = True
+            await company_services_changed(service.company_id, session)
             await session.commit()
             await session.refresh(service)
 
@@ -279,6 +338,7 @@ async def make_service_closed(service_id: UUID, session: AsyncSession):
         service.viewed_customer = False
         service.viewed_executor = False
 
+        await company_services_changed(service.company_id, session)
         await session.commit()
         await session.refresh(service)
 
@@ -294,7 +354,73 @@ async def make_service_closed(service_id: UUID, session: AsyncSession):
         await session.close()
 
 
-async def get_all_companies_with_services_info(page: int, limit: int, session: AsyncSession, executor_id: int = None):
+async def get_companies_from_stats(page: int, limit: int, session: AsyncSession, executor_id: int = None,
+                                   cursor: str = None):
+    """Список компаний по готовым счётчикам из company_service_stats"""
+    offset = (page - 1) * limit
+    stats = CompanyServiceStats
+
+    query = (
+        select(Company.id, Company.name, Company.address, stats)
+        .select_from(stats)
+        .join(Company, Company.id == stats.company_id)
+        .join(User, User.id == Company.user_id)
+        .where(
+            stats.executor_id == (executor_id or 0),  # 0 - счётчики по всем заявкам компании
+            User.is_active
+        )
+    )
+
+    # Сортируем по дате обновления последней заявки
+    rows, total, _, next_cursor = await fetch_page(
+        query, (stats.last_activity_at, stats.company_id), limit, session, offset=offset, cursor=cursor
+    )
+
+    response = []
+
+    for row in rows:
+        company_stats = row.CompanyServiceStats
+
+        if executor_id:
+            badge = {
+                "mark": company_stats.unviewed_executor > 0,
+                "counter": company_stats.working_unviewed_executor
+            }
+            tabs = {
+                "new": 0,
+                "working": company_stats.working_unviewed_executor,
+                "verifying": company_stats.verifying_unviewed_executor,
+                "closed": company_stats.closed_unviewed_executor,
+            }
+        else:
+            badge = {
+                "mark": company_stats.unviewed_admin > 0,
+                "counter": company_stats.new_unviewed_admin
+            }
+            tabs = {
+                "new": company_stats.new_unviewed_admin,
+                "working": company_stats.working_unviewed_admin,
+                "verifying": company_stats.verifying_unviewed_admin,
+                "closed": company_stats.closed_unviewed_admin,
+            }
+
+        response.append({
+            "id": row.id,
+            "name": row.name,
+            "address": row.address,
+            "badge": badge,
+            "tabs": tabs
+        })
+
+    return response, total, next_cursor
+
+
+@cached(lambda **_: (COMPANIES_SCOPE,))
+async def get_all_companies_with_services_info(page: int, limit: int, session: AsyncSession, executor_id: int = None,
+                                               cursor: str = None):
+    if settings.COMPANY_STATS_ENABLED:
+        return await get_companies_from_stats(page, limit, session, executor_id, cursor)
+
     offset = (page - 1) * limit
 
     active_customer_subquery = (
@@ -306,18 +432,6 @@ async def get_all_companies_with_services_info(page: int, limit: int, session: A
 
     #######################################################################
     if executor_id:
-        count_query = (
-            select(func.count())
-            .select_from(Company)
-            .where(exists().where(
-                and_(
-                    Service.company_id == Company.id,
-                    Service.executor_id == executor_id,
-                    Company.id.in_(active_customer_subquery)
-                )
-            ))
-        )
-
         query = (
             select(
                 Company,
@@ -337,25 +451,10 @@ async def get_all_companies_with_services_info(page: int, limit: int, session: A
                 Service.executor_id == executor_id,
                 Company.id.in_(active_customer_subquery)
             ))
-            .options(selectinload(Company.services))
             .group_by(Company.id)  # Группируем по компании
-            .order_by(desc(func.max(Service.updated_at)))  # Сортируем по дате обновления первого сервиса
-            .offset(offset)
-            .limit(limit)
         )
 
     else:
-        count_query = (
-            select(func.count())
-            .select_from(Company)
-            .where(exists().where(
-                and_(
-                    Service.company_id == Company.id,
-                    Company.id.in_(active_customer_subquery)
-                ))
-            )
-        )
-
         query = (
             select(
                 Company,
@@ -374,20 +473,15 @@ async def get_all_companies_with_services_info(page: int, limit: int, session: A
             .where(and_(
                 Company.id.in_(active_customer_subquery)
             ))
-            .options(selectinload(Company.services))
             .group_by(Company.id)  # Группируем по компании
-            .order_by(desc(func.max(Service.updated_at)))  # Сортируем по дате обновления первого сервиса
-            .offset(offset)
-            .limit(limit)
         )
 
     #######################################################################
-    total_records = await session.execute(count_query)
-    total = total_records.scalar()
-
-    # Выполняем запрос и Получаем все объекты Company из результата
-    result = await session.execute(query)
-    companies = result.all()
+    # Сортируем по дате обновления последнего сервиса; общее кол-во компаний - в том же запросе
+    companies, total, _, next_cursor = await fetch_page(
+        query, (func.max(Service.updated_at), Company.id), limit, session, offset=offset, cursor=cursor,
+        aggregated=True
+    )
 
     response = []
 
@@ -401,8 +495,8 @@ async def get_all_companies_with_services_info(page: int, limit: int, session: A
             "address": company.address,
             "badge": {
                 "mark": marked,
-                "counter": company.new_services_count_executor(
-                    executor_id) if executor_id else company.new_services_count
+                # Счётчик бейджа совпадает со вкладкой: новые для администратора, в работе для исполнителя
+                "counter": company_with_mark.working if executor_id else company_with_mark.new
             },
             "tabs": {
                 "new": 0 if executor_id else company_with_mark.new,
@@ -415,197 +509,26 @@ async def get_all_companies_with_services_info(page: int, limit: int, session: A
 
     # Close the session
     await session.close()
-    return response, total
+    return response, total, next_cursor
 
 
+@cached(lambda company_id, **_: (company_scope(company_id),))
 async def get_services_by_status(service_status: ServiceStatus, company_id: UUID, sort: str, page: int, limit: int,
                                  emergency: bool, custom_position: bool, session: AsyncSession,
-                                 executor_id: int = None):
+                                 executor_id: int = None, cursor: str = None):
     offset = (page - 1) * limit
 
-    if executor_id:
-        unviewed_count_query = (
-            select(func.count())
-            .select_from(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                Service.executor_id == executor_id,
-                Service.viewed_executor == False,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-        )
-
-        count_query = (
-            select(func.count())
-            .select_from(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                Service.executor_id == executor_id,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-        )
-
-        query = (
-            select(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                Service.executor_id == executor_id,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-            .order_by(
-                asc(Service.updated_at) if sort == "date_asc" else desc(Service.updated_at)
-            )  # Сортируем по дате
-            .offset(offset)
-            .limit(limit)
-        )
-
-    else:
-        unviewed_count_query = (
-            select(func.count())
-            .select_from(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                Service.viewed_admin == False,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-        )
-
-        count_query = (
-            select(func.count())
-            .select_from(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-        )
-
-        query = (
-            select(Service)
-            .where(
-                Service.company_id == company_id,
-                Service.status == service_status,
-                or_(
-                    and_(Service.emergency == True, emergency == True, custom_position == False),
-                    and_(Service.custom_position == True, emergency == False, custom_position == True),
-                    and_(
-                        or_(Service.emergency == True, Service.custom_position == True),
-                        emergency == True,
-                        custom_position == True
-                    ),
-                    and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                         custom_position == False),
-                    and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                         custom_position == False)
-                )
-            )
-            .order_by(
-                asc(Service.updated_at) if sort == "date_asc" else desc(Service.updated_at)
-            )  # Сортируем по дате
-            .offset(offset)
-            .limit(limit)
-        )
-
-    total_records_unviewed = await session.execute(unviewed_count_query)
-    total_unviewed = total_records_unviewed.scalar()
-
-    total_records = await session.execute(count_query)
-    total = total_records.scalar()
-
-    result = await session.execute(query)
+    role = Roles.EXECUTOR if executor_id else Roles.ADMIN
+    query, unviewed_filter = services_list_query(role, service_status, company_id, emergency, custom_position,
+                                                 executor_id)
 
-    # Получаем все объекты Company из результата
-    services = result.scalars().all()
+    # Страница, общее кол-во и кол-во непросмотренных - одним запросом; сортируем по дате
+    services, total, total_unviewed, next_cursor = await fetch_page(
+        query, (Service.updated_at, Service.id), limit, session, offset=offset, cursor=cursor,
+        descending=sort != "date_asc", counter_filter=unviewed_filter
+    )
 
-    return services, total, total_unviewed
+    return services, total, total_unviewed, next_cursor
 
 
 async def get_company_id_by_customer(customer_id: int, session: AsyncSession):
@@ -617,108 +540,45 @@ async def get_company_id_by_customer(customer_id: int, session: AsyncSession):
 
 async def get_customer_services_by_status(service_status: ServiceStatus, company_id: UUID, sort: str, page: int,
                                           limit: int, emergency: bool, custom_position: bool, session: AsyncSession,
-                                          customer_id: int):
+                                          customer_id: int, cursor: str = None):
     offset = (page - 1) * limit
 
-    count_query = (
-        select(func.count())
-        .select_from(Service)
-        .where(
-            Service.company_id == company_id,
-            Service.status == service_status,
-            Service.customer_id == customer_id,
-            or_(
-                and_(Service.emergency == True, emergency == True, custom_position == False),
-                and_(Service.custom_position == True, emergency == False, custom_position == True),
-                and_(
-                    or_(Service.emergency == True, Service.custom_position == True),
-                    emergency == True,
-                    custom_position == True
-                ),
-                and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                     custom_position == False)
-            )
-        )
-    )
+    query, unviewed_filter = services_list_query(Roles.CUSTOMER, service_status, company_id, emergency,
+                                                 custom_position, customer_id)
 
-    unviewed_count_query = (
-        select(func.count())
-        .select_from(Service)
-        .where(
-            Service.company_id == company_id,
-            Service.status == service_status,
-            Service.customer_id == customer_id,
-            Service.viewed_customer == False,
-            or_(
-                and_(Service.emergency == True, emergency == True, custom_position == False),
-                and_(Service.custom_position == True, emergency == False, custom_position == True),
-                and_(
-                    or_(Service.emergency == True, Service.custom_position == True),
-                    emergency == True,
-                    custom_position == True
-                ),
-                and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                     custom_position == False)
-            )
-        )
+    # Страница, общее кол-во и кол-во непросмотренных - одним запросом; сортируем по дате
+    services, total, total_unviewed, next_cursor = await fetch_page(
+        query, (Service.updated_at, Service.id), limit, session, offset=offset, cursor=cursor,
+        descending=sort != "date_asc", counter_filter=unviewed_filter
     )
 
-    query = (
-        select(Service)
-        # .options(joinedload(Service.executor))  # Загрузка данных связанной таблицы
-        .where(
-            Service.company_id == company_id,
-            Service.status == service_status,
-            Service.customer_id == customer_id,
-            or_(
-                and_(Service.emergency == True, emergency == True, custom_position == False),
-                and_(Service.custom_position == True, emergency == False, custom_position == True),
-                and_(
-                    or_(Service.emergency == True, Service.custom_position == True),
-                    emergency == True,
-                    custom_position == True
-                ),
-                and_(Service.custom_position == False, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == False, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == False, Service.emergency == True, emergency == False,
-                     custom_position == False),
-                and_(Service.custom_position == True, Service.emergency == True, emergency == False,
-                     custom_position == False)
-            )
-        )
-        .order_by(
-            asc(Service.updated_at) if sort == "date_asc" else desc(Service.updated_at)
-        )  # Сортируем по дате
-        .offset(offset)
-        .limit(limit)
-    )
+    return services, total, total_unviewed, next_cursor
 
-    total_records = await session.execute(count_query)
-    total = total_records.scalar()
 
-    total_records_unviewed = await session.execute(unviewed_count_query)
-    total_unviewed = total_records_unviewed.scalar()
+async def search_services(search: str, limit: int, session: AsyncSession, service_status: ServiceStatus = None,
+                          company_id: UUID = None, executor_id: int = None, date_from: datetime = None,
+                          date_to: datetime = None, cursor: str = None):
+    """Полнотекстовый поиск заявок с сортировкой по релевантности"""
+    search_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), search)
 
-    result = await session.execute(query)
+    query = select(Service).where(Service.search_vector.op("@@")(search_query))
+
+    if service_status:
+        query = query.where(Service.status == service_status)
+    if company_id:
+        query = query.where(Service.company_id == company_id)
+    if executor_id:
+        query = query.where(Service.executor_id == executor_id)
+    if date_from:
+        query = query.where(Service.created_at >= date_from)
+    if date_to:
+        query = query.where(Service.created_at < date_to)
 
-    # Получаем все объекты Company из результата
-    services = result.scalars().all()
+    # Сначала самые релевантные; курсор по (ранг, id)
+    rank = func.ts_rank_cd(Service.search_vector, search_query, type_=Float)
+    services, total, _, next_cursor = await fetch_page(query, (rank, Service.id), limit, session, cursor=cursor)
 
-    return services, total, total_unviewed
+    return services, total, next_cursor
 
 
 async def delete_service(service_id: UUID, session: AsyncSession):
@@ -738,9 +598,13 @@ async def delete_service(service_id: UUID, session: AsyncSession):
 
         # Now, delete the service
         await session.delete(service)
+        await company_services_changed(service.company_id, session)
+        invalidate_after_commit(session, service_scope(service_id))  # в т.ч. пути медиафайлов заявки
 
         # Commit the changes
         await session.commit()
+        # Файлы заявки вместе с копиями изображений, созданными при загрузке и при запросах
+        await media_service.remove_service_media_dirs(service_id)
 
         print('Service and associated media files deleted successfully')
 
@@ -806,6 +670,7 @@ async def update_service_by_admin(customer_id: int, service_data: ServiceUpdateI
     #     else:
     #         service.viewed_customer = False  # Непросмотрено заказчиком
 
+    await company_services_changed(service.company_id, session)
     await session.commit()
     await session.refresh(service)
     return service
@@ -0,0 +1,261 @@
+"""
+Счётчики заявок компаний (таблица company_service_stats) для списка компаний.
+
+Счётчики обновляются приращениями в той же транзакции, в которой меняются заявки: перед flush для каждой
+добавленной, изменённой или удалённой заявки запоминается её прежнее и новое состояние (компания, исполнитель,
+статус, флаги просмотра), после flush строки счётчиков получают +1 за новое состояние и -1 за прежнее
+(UPSERT ... SET counter = counter + delta). Пересчёта по всем заявкам компании и блокировки на запись нет.
+Строка без заявок (services_count = 0) удаляется.
+
+Изменения заявок в обход ORM (UPDATE/DELETE через Core) счётчики не видят. Для исправления расхождений -
+полный пересчёт: python -m src.services.stats (scripts/rebuild-company-stats)
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from sqlalchemy import (
+    Select,
+    and_,
+    delete,
+    event,
+    false,
+    func,
+    insert,
+    inspect,
+    literal_column,
+    select,
+    text,
+    true,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.database import async_session_maker, engine, use_primary
+from src.models import CompanyServiceStats, Service, ServiceStatus
+
+STATS_LOCK_NAMESPACE = 5100  # пространство advisory-блокировок пересчёта счётчиков
+
+# Счётчик: (статус или None - любой, флаг просмотра или None) - заявка учитывается, если статус совпал
+# и флаг равен False (не просмотрена)
+COUNTER_SPECS: dict[str, tuple[ServiceStatus | None, str | None]] = {
+    "services_count": (None, None),
+    "new_count": (ServiceStatus.NEW, None),
+    "working_count": (ServiceStatus.WORKING, None),
+    "verifying_count": (ServiceStatus.VERIFYING, None),
+    "closed_count": (ServiceStatus.CLOSED, None),
+    "unviewed_admin": (None, "viewed_admin"),
+    "new_unviewed_admin": (ServiceStatus.NEW, "viewed_admin"),
+    "working_unviewed_admin": (ServiceStatus.WORKING, "viewed_admin"),
+    "verifying_unviewed_admin": (ServiceStatus.VERIFYING, "viewed_admin"),
+    "closed_unviewed_admin": (ServiceStatus.CLOSED, "viewed_admin"),
+    "unviewed_executor": (None, "viewed_executor"),
+    "working_unviewed_executor": (ServiceStatus.WORKING, "viewed_executor"),
+    "verifying_unviewed_executor": (ServiceStatus.VERIFYING, "viewed_executor"),
+    "closed_unviewed_executor": (ServiceStatus.CLOSED, "viewed_executor"),
+}
+
+
+def _counter_condition(status: ServiceStatus | None, flag: str | None):
+    conditions = []
+    if status is not None:
+        conditions.append(Service.status == status)
+    if flag is not None:
+        conditions.append(getattr(Service, flag) == false())
+    return and_(*conditions) if conditions else true()
+
+
+STATS_COUNTERS = {name: _counter_condition(*spec) for name, spec in COUNTER_SPECS.items()}
+
+STATS_COLUMNS = ["company_id", "executor_id", *STATS_COUNTERS, "last_activity_at"]
+
+
+class ServiceState(NamedTuple):
+    company_id: UUID | None
+    executor_id: int | None
+    status: ServiceStatus
+    viewed_admin: bool
+    viewed_executor: bool
+
+
+STATE_FIELDS = ServiceState._fields
+# Значения по умолчанию, которые новая заявка получает только при INSERT
+STATE_DEFAULTS = {"status": ServiceStatus.NEW, "viewed_admin": False, "viewed_executor": False}
+
+
+def _counts(state: ServiceState) -> dict[str, int]:
+    return {
+        name: 1 for name, (status, flag) in COUNTER_SPECS.items()
+        if (status is None or state.status == status) and (flag is None or not getattr(state, flag))
+    }
+
+
+def _stats_keys(state: ServiceState) -> list[tuple[UUID, int]]:
+    """Строки счётчиков заявки: по всей компании (executor_id = 0) и по её исполнителю"""
+    if state.company_id is None:
+        return []
+    keys = [(state.company_id, 0)]
+    if state.executor_id is not None:
+        keys.append((state.company_id, state.executor_id))
+    return keys
+
+
+class _NotLoaded(Exception):
+    pass
+
+
+def _service_state(service: Service, previous: bool) -> ServiceState:
+    """Состояние заявки до (previous) или после изменений в сессии, без обращения к базе"""
+    instance_state = inspect(service)
+    values = {}
+    for field in STATE_FIELDS:
+        history = instance_state.attrs[field].history
+        if previous and history.deleted:
+            value = history.deleted[0]
+        elif not previous and history.added:
+            value = history.added[0]
+        elif history.unchanged:
+            value = history.unchanged[0]
+        elif field in instance_state.dict or instance_state.pending:
+            value = instance_state.dict.get(field)
+        else:
+            raise _NotLoaded(field)
+        values[field] = STATE_DEFAULTS.get(field) if value is None and field in STATE_DEFAULTS else value
+    return ServiceState(**values)
+
+
+def _add_delta(deltas: dict, state: ServiceState, sign: int) -> None:
+    for key in _stats_keys(state):
+        for name, count in _counts(state).items():
+            deltas[key][name] += sign * count
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_stats_deltas(session: Session, flush_context: Any, instances: Any) -> None:
+    deltas = session.info.setdefault("stats_deltas", defaultdict(lambda: defaultdict(int)))
+    touched = session.info.setdefault("stats_touched", set())
+    recompute = session.info.setdefault("stats_recompute", set())
+
+    changes = [
+        *((service, False, True) for service in session.new),
+        *((service, True, True) for service in session.dirty),
+        *((service, True, False) for service in session.deleted),
+    ]
+    for service, has_previous, has_new in changes:
+        if not isinstance(service, Service):
+            continue
+        if has_previous and has_new and not session.is_modified(service):
+            continue
+        try:
+            previous = _service_state(service, previous=True) if has_previous and not inspect(service).pending \
+                else None
+            new = _service_state(service, previous=False) if has_new else None
+        except _NotLoaded:
+            # Прежнее состояние неизвестно без запроса - компания пересчитывается целиком
+            company_id = inspect(service).dict.get("company_id")
+            if company_id:
+                recompute.add(company_id)
+            continue
+
+        if previous is not None:
+            _add_delta(deltas, previous, -1)
+        if new is not None:
+            _add_delta(deltas, new, 1)
+            touched.update(_stats_keys(new))
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_stats_deltas(session: Session, flush_context: Any) -> None:
+    deltas = session.info.pop("stats_deltas", None) or {}
+    touched = session.info.pop("stats_touched", None) or set()
+    recompute = session.info.pop("stats_recompute", None) or set()
+    connection = session.connection()
+
+    # Одинаковый порядок строк во всех транзакциях - без взаимных блокировок
+    for company_id, executor_id in sorted(set(deltas) | touched, key=lambda key: (str(key[0]), key[1])):
+        if company_id in recompute:
+            continue
+        changed = {name: delta for name, delta in deltas.get((company_id, executor_id), {}).items() if delta}
+        is_touched = (company_id, executor_id) in touched
+        if not changed and not is_touched:
+            continue
+
+        # Новая строка всегда получает время активности: по last_activity_at список компаний листается курсором
+        stmt = pg_insert(CompanyServiceStats).values(
+            company_id=company_id, executor_id=executor_id, **changed, last_activity_at=func.now(),
+        )
+        set_ = {name: getattr(CompanyServiceStats, name) + getattr(stmt.excluded, name) for name in changed}
+        if is_touched:
+            set_["last_activity_at"] = func.greatest(CompanyServiceStats.last_activity_at,
+                                                     stmt.excluded.last_activity_at)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[CompanyServiceStats.company_id, CompanyServiceStats.executor_id],
+            set_=set_,
+        ))
+        if changed.get("services_count", 0) < 0:
+            connection.execute(delete(CompanyServiceStats).where(
+                CompanyServiceStats.company_id == company_id,
+                CompanyServiceStats.executor_id == executor_id,
+                CompanyServiceStats.services_count <= 0,
+            ))
+
+    for company_id in sorted(recompute, key=str):
+        connection.execute(select(func.pg_advisory_xact_lock(STATS_LOCK_NAMESPACE, func.hashtext(str(company_id)))))
+        connection.execute(delete(CompanyServiceStats).where(CompanyServiceStats.company_id == company_id))
+        connection.execute(_stats_insert(company_id))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stats_deltas(session: Session) -> None:
+    for key in ("stats_deltas", "stats_touched", "stats_recompute"):
+        session.info.pop(key, None)
+
+
+def _stats_select(by_executor: bool, company_id: UUID = None) -> Select:
+    executor_id = Service.executor_id if by_executor else literal_column("0")
+    query = (
+        select(
+            Service.company_id,
+            executor_id,
+            *(func.count().filter(condition) for condition in STATS_COUNTERS.values()),
+            func.max(Service.updated_at),
+        )
+        .where(Service.company_id.isnot(None))
+        .group_by(Service.company_id)
+    )
+
+    if by_executor:
+        query = query.where(Service.executor_id.isnot(None)).group_by(Service.executor_id)
+    if company_id:
+        query = query.where(Service.company_id == company_id)
+
+    return query
+
+
+def _stats_insert(company_id: UUID = None):
+    return insert(CompanyServiceStats).from_select(
+        STATS_COLUMNS,
+        union_all(_stats_select(False, company_id), _stats_select(True, company_id))
+    )
+
+
+async def rebuild_company_stats(session: AsyncSession) -> None:
+    """Полный пересчёт счётчиков всех компаний (исправление расхождений)"""
+    use_primary(session)
+    await session.execute(text("LOCK TABLE public.company_service_stats IN SHARE ROW EXCLUSIVE MODE"))
+    await session.execute(delete(CompanyServiceStats))
+    await session.execute(_stats_insert())
+    await session.commit()
+
+
+async def main() -> None:
+    async with async_session_maker() as session:
+        await rebuild_company_stats(session)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,7 +9,7 @@ from src.auth import service as auth_service
 from src.auth.exceptions import UsernameTaken, AuthorizationFailed
 from src.auth.jwt import parse_jwt_user_data, validate_admin_access, validate_customer_access, validate_users_access
 from src.auth.schemas import JWTData
-from src.database import get_async_session
+from src.database import get_async_session, get_routing_async_session
 from src.models import User
 from src.users import service as users_service
 from src.users.schemas import (
@@ -70,11 +70,12 @@ async def get_executor_account(
 async def get_customers_list(
         search: str = Query(None),
         page: int = 1,
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor), заменяет page"),
         limit: int = Query(default=25, lte=50),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_routing_async_session)
 ) -> dict[str, Any]:
     offset = (page - 1) * limit
-    response = await users_service.get_customers(search, offset, limit, session)
+    response = await users_service.get_customers(search, offset, limit, session, cursor)
 
     return response
 
@@ -83,11 +84,12 @@ async def get_customers_list(
 async def get_executors_list(
         search: str = Query(None),
         page: int = 1,
+        cursor: str = Query(None, description="Курсор следующей страницы (next_cursor), заменяет page"),
         limit: int = Query(default=25, lte=50),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_routing_async_session)
 ) -> dict[str, Any]:
     offset = (page - 1) * limit
-    response = await users_service.get_executors(search, offset, limit, session)
+    response = await users_service.get_executors(search, offset, limit, session, cursor)
 
     return response
 
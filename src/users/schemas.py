@@ -63,6 +63,7 @@ class ExecutorsList(CustomModel):
 
 class CustomersListPaginated(CustomModel):
     total: int
+    next_cursor: str | None = None
     items: List[CustomersList]
 
 
@@ -77,6 +78,7 @@ class ExecutorUserResponse(CustomModel):
 
 class ExecutorsListPaginated(CustomModel):
     total: int
+    next_cursor: str | None = None
     items: List[ExecutorsList]
 
 
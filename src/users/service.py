@@ -1,17 +1,23 @@
+import re
 from datetime import timedelta, datetime
 from typing import Any
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy import and_, func, or_, select, delete, desc, update
+from sqlalchemy import Float, and_, func, or_, select, delete, update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from src.cache import COMPANIES_SCOPE, invalidate_after_commit
+from src.config import settings
 from src.models import Company, CompanyContacts, User, Roles, RefreshTokens
+from src.pagination import fetch_page
 from src.users.schemas import CreateCustomerInput, CreateExecutorInput, EditUserCredentials, EditUserPersonalData, \
     EditCustomerCompany, EditCustomerContacts
 
+PHONE_SEARCH_MIN_DIGITS = 3  # поиск по части телефона - от длины триграммы pg_trgm
+
 
 async def get_user_profile_by_id(user_id: int, session: AsyncSession) -> dict[str, Any] | None:
     select_query = select(User).where(User.id == user_id).options(
@@ -35,64 +41,74 @@ async def get_user_by_role(user_id: int, role: str, session: AsyncSession) -> di
     return response
 
 
-async def get_customers(search: str, offset: int, limit: int, session: AsyncSession) -> dict[str, Any] | None:
+async def get_customers(search: str, offset: int, limit: int, session: AsyncSession,
+                        cursor: str = None) -> dict[str, Any] | None:
     search_conditions = []
+    order_by = (User.created_at, User.id)
 
     if search:
+        # ILIKE по подстроке использует GIN-индексы pg_trgm по названию и адресу компании
         search_conditions.append(or_(
             Company.name.ilike(f"%{search}%"),
             Company.address.ilike(f"%{search}%")
         ))
+        if settings.SEARCH_TRIGRAM_ENABLED:
+            # Сначала самые похожие на запрос (pg_trgm)
+            order_by = (func.greatest(func.word_similarity(search, Company.name),
+                                      func.word_similarity(search, Company.address), type_=Float), User.id)
 
     base_condition = User.is_customer
 
     if search_conditions:
         base_condition = and_(base_condition, *search_conditions)
 
-    count_query = (
-        select(func.count())
-        .select_from(User)
-        .join(Company, User.customer_company)
-        .where(base_condition, User.is_active)
-    )
-
-    total_records = await session.execute(count_query)
-    total = total_records.scalar()
-
     select_query = (
-        select(User.id, Company.id, Company.name, Company.address)
+        select(User.id.label("user_id"), Company.id.label("company_id"), Company.name, Company.address)
         .join(Company)
         .where(base_condition, User.is_active)
-        .order_by(desc(User.created_at))
-        .offset(offset)
-        .limit(limit)
     )
 
-    customers = await session.execute(select_query)
-    response = customers.fetchall()
+    # Страница и общее кол-во - одним запросом
+    response, total, _, next_cursor = await fetch_page(select_query, order_by, limit, session,
+                                                       offset=offset, cursor=cursor)
 
     response_data = []
-    for user_id, company_id, company_name, company_address in response:
+    for customer in response:
         response_data.append({
-            "id": user_id,
+            "id": customer.user_id,
             "customer_company": {
-                "id": company_id,
-                "name": company_name,
-                "address": company_address
+                "id": customer.company_id,
+                "name": customer.name,
+                "address": customer.address
             }
         })
 
     response = {
         "total": total,
+        "next_cursor": next_cursor,
         "items": response_data
     }
     return response
 
 
-async def get_executors(search: str, offset: int, limit: int, session: AsyncSession) -> dict[str, Any] | None:
+async def get_executors(search: str, offset: int, limit: int, session: AsyncSession,
+                        cursor: str = None) -> dict[str, Any] | None:
     search_conditions = []
-
-    if search:
+    order_by = (User.created_at, User.id)
+
+    if search and settings.SEARCH_TRIGRAM_ENABLED:
+        # Телефон ищется по цифрам: "+7 (999) 12" находит номер в любом формате записи
+        digits = re.sub(r"\D", "", search)
+        conditions = [User.name.ilike(f"%{search}%")]
+        similarities = [func.word_similarity(search, User.name)]
+        # Короче триграммы запрос совпадает почти с каждым номером и не использует индекс
+        if len(digits) >= PHONE_SEARCH_MIN_DIGITS:
+            conditions.append(User.phone_digits.like(f"%{digits}%"))
+            similarities.append(func.word_similarity(digits, User.phone_digits))
+
+        search_conditions.append(or_(*conditions))
+        order_by = (func.greatest(*similarities, type_=Float), User.id)
+    elif search:
         search_conditions.append(or_(
             User.name.ilike(f"%{search}%"),
             User.phone.ilike(f"%{search}%")
@@ -103,25 +119,14 @@ async def get_executors(search: str, offset: int, limit: int, session: AsyncSess
     if search_conditions:
         base_condition = and_(base_condition, *search_conditions)
 
-    count_query = (
-        select(func.count())
-        .select_from(User)
-        .where(base_condition, User.is_active)
-    )
-
-    total_records = await session.execute(count_query)
-    total = total_records.scalar()
-
     select_query = (
         select(User.id, User.name, User.phone, User.username)
         .where(base_condition, User.is_active)
-        .order_by(desc(User.created_at))
-        .offset(offset)
-        .limit(limit)
     )
 
-    executors = await session.execute(select_query)
-    response = executors.fetchall()
+    # Страница и общее кол-во - одним запросом
+    response, total, _, next_cursor = await fetch_page(select_query, order_by, limit, session,
+                                                       offset=offset, cursor=cursor)
 
     response_data = []
     for user in response:
@@ -134,6 +139,7 @@ async def get_executors(search: str, offset: int, limit: int, session: AsyncSess
 
     response = {
         "total": total,
+        "next_cursor": next_cursor,
         "items": response_data
     }
     return response
@@ -191,6 +197,7 @@ async def create_customer(customer_data: CreateCustomerInput, session: AsyncSess
         )
 
         session.add(customer_company)
+        invalidate_after_commit(session, COMPANIES_SCOPE)
         await session.commit()
         await session.refresh(customer_company)
 
@@ -229,6 +236,8 @@ async def block_user(user_id: int, session: AsyncSession) -> bool:
                 .values(expires_at=datetime.utcnow() - timedelta(days=1))
             )
             await session.execute(update_query)
+            # Компании заблокированных заказчиков не выводятся в списке
+            invalidate_after_commit(session, COMPANIES_SCOPE)
             await session.commit()
             return True
 
@@ -298,6 +307,7 @@ async def edit_users_company(company_id: UUID, company_data: EditCustomerCompany
         if company_data.only_weekdays:
             company.only_weekdays = company_data.only_weekdays
 
+        invalidate_after_commit(session, COMPANIES_SCOPE)
         await session.commit()
         await session.refresh(company)
         return company
@@ -0,0 +1,44 @@
+"""
+Условные запросы медиафайлов (src/media/responses.py): If-None-Match сравнивается с ETag,
+If-Modified-Since - с mtime файла и только без If-None-Match. Кэширование - не дольше срока ссылки.
+"""
+import time
+from email.utils import formatdate
+
+import pytest
+
+from src.config import settings
+from src.media.responses import is_not_modified, media_cache_control, media_etag
+
+ETAG = media_etag("key", "full", "webp")
+MTIME = 1_700_000_000.5
+
+
+@pytest.mark.parametrize("if_none_match, if_modified_since, mtime, expected", [
+    (ETAG, None, MTIME, True),
+    (f'"other", W/{ETAG}', None, MTIME, True),
+    ("*", None, MTIME, True),
+    ('"other"', None, MTIME, False),
+    # If-None-Match важнее If-Modified-Since
+    ('"other"', formatdate(MTIME + 3600, usegmt=True), MTIME, False),
+    (ETAG, formatdate(MTIME - 3600, usegmt=True), MTIME, True),
+    (None, formatdate(MTIME, usegmt=True), MTIME, True),
+    (None, formatdate(MTIME + 3600, usegmt=True), MTIME, True),
+    (None, formatdate(MTIME - 3600, usegmt=True), MTIME, False),
+    (None, formatdate(MTIME, usegmt=True), None, False),
+    (None, "yesterday", MTIME, False),
+    (None, "", MTIME, False),
+    (None, None, MTIME, False),
+])
+def test_is_not_modified(if_none_match, if_modified_since, mtime, expected):
+    assert is_not_modified(ETAG, if_none_match, if_modified_since, mtime) is expected
+
+
+@pytest.mark.parametrize("expires_in, max_age", [
+    (settings.MEDIA_URL_TTL * 2, settings.MEDIA_URL_TTL),
+    (600, 600),
+    (-5, 0),
+])
+def test_media_cache_control_within_link_lifetime(monkeypatch, expires_in, max_age):
+    monkeypatch.setattr(time, "time", lambda: 1_700_000_000)
+    assert media_cache_control(1_700_000_000 + expires_in) == f"public, max-age={max_age}, immutable"
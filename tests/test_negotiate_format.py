@@ -0,0 +1,35 @@
+"""
+Выбор формата изображения по Accept (src/media/processing.py): q-значения, q=0 исключает формат,
+без Accept и по маске - основной файл WebP.
+"""
+import pytest
+
+from src.media import processing
+from src.media.processing import negotiate_format
+
+
+@pytest.fixture(autouse=True)
+def all_formats_supported(monkeypatch):
+    # Кодировщик AVIF есть не в каждой сборке Pillow
+    monkeypatch.setattr(processing, "SUPPORTED_FORMATS", list(processing.IMAGE_FORMATS))
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "webp"),
+    ("", "webp"),
+    ("*/*", "webp"),
+    ("image/*", "webp"),
+    ("image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8", "avif"),
+    ("image/webp,*/*", "webp"),
+    ("image/avif;q=0,*/*", "webp"),
+    ("image/avif;q=0, image/webp;q=0, */*", "jpeg"),
+    ("image/avif;q=0.5,image/webp;q=0.9", "webp"),
+    ("image/avif;q=0.5,image/*;q=0.9", "webp"),
+    ("IMAGE/AVIF; Q=1", "avif"),
+    ("image/jpeg", "jpeg"),
+    ("image/png", "jpeg"),
+    ("image/avif;q=0", "jpeg"),
+    ("image/avif;q=abc,image/webp", "webp"),
+])
+def test_negotiate_format(accept, expected):
+    assert negotiate_format(accept) == expected
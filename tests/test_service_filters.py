@@ -0,0 +1,55 @@
+"""
+Новые условия списков заявок по флагам emergency / custom_position (src/services/filters.py) должны выбирать
+те же заявки, что и прежнее условие, для всех сочетаний флагов запроса и значений колонок заявки.
+Условия выполняются в SQLite в памяти на таблице с колонками заявки, которые они используют.
+"""
+import itertools
+
+import pytest
+from sqlalchemy import create_engine, event, select
+
+from src.models import Service
+from src.services.filters import FLAG_FILTERS, _legacy_flags_filter, flags_filter
+
+# Все сочетания (emergency, custom_position): значения колонок заявки и флаги запроса
+COMBINATIONS = list(itertools.product([False, True], repeat=2))
+
+
+@pytest.fixture(scope="module")
+def connection():
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def attach_public_schema(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS public")
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE public.services (emergency BOOLEAN NOT NULL, custom_position BOOLEAN NOT NULL)"
+        )
+        conn.exec_driver_sql("INSERT INTO public.services VALUES (?, ?)", COMBINATIONS)
+        yield conn
+
+    engine.dispose()
+
+
+def _selected(connection, condition) -> set[tuple[bool, bool]]:
+    query = select(Service.emergency, Service.custom_position)
+    if condition is not None:
+        query = query.where(condition)
+    return {(bool(emergency), bool(custom_position)) for emergency, custom_position in connection.execute(query)}
+
+
+def test_all_flag_combinations_covered():
+    assert set(FLAG_FILTERS) == set(COMBINATIONS)
+
+
+def test_table_has_every_column_combination(connection):
+    assert _selected(connection, None) == set(COMBINATIONS)
+
+
+@pytest.mark.parametrize("emergency, custom_position", COMBINATIONS)
+def test_flags_filter_matches_legacy(connection, emergency, custom_position):
+    assert _selected(connection, flags_filter(emergency, custom_position)) == \
+        _selected(connection, _legacy_flags_filter(emergency, custom_position))
+
@@ -0,0 +1,79 @@
+"""
+Лимиты размера файлов формы (src/media/uploads.py): UploadLimitMiddleware считает байты каждой части
+multipart по мере приёма тела и отклоняет запрос с 413 по лимиту поля (video_file / image_files).
+"""
+from typing import List
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from src.config import settings
+from src.media.exceptions import ImageTooLarge, VideoTooLarge
+from src.media.uploads import UploadLimitMiddleware, _PartSizeLimiter
+
+BOUNDARY = b"boundary"
+
+
+@pytest.fixture(autouse=True)
+def small_limits(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_VIDEO_SIZE", 1000)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_IMAGE_SIZE", 100)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_REQUEST_SIZE", 10_000)
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware)
+
+    @app.post("/upload")
+    async def upload(video_file: UploadFile = File(None), image_files: List[UploadFile] = File(None)):
+        return {"video": video_file.size if video_file else None, "images": [image.size for image in image_files or []]}
+
+    return TestClient(app)
+
+
+def _multipart(*parts: tuple[str, str | None, bytes]) -> bytes:
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += b"--" + BOUNDARY + b"\r\nContent-Disposition: " + disposition.encode() + b"\r\n\r\n" + content + b"\r\n"
+    return body + b"--" + BOUNDARY + b"--\r\n"
+
+
+def _post(client, body: bytes):
+    return client.post("/upload", content=body,
+                       headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY.decode()}"})
+
+
+def test_files_within_limits_accepted(client):
+    response = _post(client, _multipart(("video_file", "v.mp4", b"v" * 1000), ("image_files", "a.jpg", b"i" * 100),
+                                        ("image_files", "b.jpg", b"i" * 50)))
+    assert response.status_code == 200
+    assert response.json() == {"video": 1000, "images": [100, 50]}
+
+
+@pytest.mark.parametrize("parts, detail", [
+    ((("video_file", "v.mp4", b"v" * 1001),), VideoTooLarge.DETAIL),
+    ((("image_files", "a.jpg", b"i" * 100), ("image_files", "b.jpg", b"i" * 101)), ImageTooLarge.DETAIL),
+])
+def test_file_over_field_limit_rejected(client, parts, detail):
+    response = _post(client, _multipart(*parts))
+    assert response.status_code == 413
+    assert response.json()["detail"] == detail
+
+
+def test_limit_raised_while_body_is_received():
+    limiter = _PartSizeLimiter(BOUNDARY)
+    body = _multipart(("image_files", "a.jpg", b"i" * 1000))
+    with pytest.raises(ImageTooLarge):
+        for offset in range(0, len(body), 64):
+            limiter.write(body[offset:offset + 64])
+    # Остановился, не дочитав файл
+    assert offset < 300
+
+
+def test_plain_fields_not_limited_by_file_limits():
+    limiter = _PartSizeLimiter(BOUNDARY)
+    limiter.write(_multipart(("image_files", None, b"x" * 1000)))